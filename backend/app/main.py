@@ -1,16 +1,28 @@
 """Blood Test Summariser API - Main FastAPI Application."""
 
+import asyncio
+import json
 import logging
 import os
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
 
-from app.models import AnalysisResult
-from app.services.analyzer import analyze_blood_test
-from app.services.llm_service import check_llm_connection
+from app.models import AnalysisResult, BatchAnalysisResult, BatchItemResult, JobStatus, JobSubmission
+from app.services.analyzer import analyze_blood_test, iter_analysis_events
+from app.services.batch import BATCH_MAX_FILES, BATCH_MAX_TOTAL_BYTES, analyze_batch, unpack_zip
+from app.services.jobs import JOB_STORE, JOB_WORKERS, SUCCEEDED, FAILED, JobWorkerPool
+from app.services.health import HEALTH_MONITOR
+from app.services.metrics import render_metrics
+from app.services.http_client import create_http_client, set_http_client, close_http_client
+from app.services.pdf_executor import get_pdf_executor, shutdown_pdf_executor
+from app.services.uploads import (
+    MAX_UPLOAD_BYTES, MULTIPART_OVERHEAD, SpooledPDF, UploadLimitMiddleware, spool_pdf_upload, spool_zip_upload,
+)
 
 load_dotenv()
 
@@ -26,8 +38,20 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     logger.info("Server starting up...")
+    http_client = create_http_client()
+    app.state.http_client = http_client
+    set_http_client(http_client)
+    get_pdf_executor()
+    HEALTH_MONITOR.start()
+    job_workers = JobWorkerPool(JOB_WORKERS)
+    app.state.job_workers = job_workers
+    job_workers.start()
     yield
     logger.info("Shutting down...")
+    await job_workers.stop()
+    await HEALTH_MONITOR.stop()
+    await close_http_client()
+    shutdown_pdf_executor()
 
 
 app = FastAPI(
@@ -37,6 +61,13 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Refuse oversized bodies before multipart parsing buffers them (added first so CORS headers still wrap its 413s)
+app.add_middleware(
+    UploadLimitMiddleware,
+    default_limit=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    limits={"/analyze/batch": BATCH_MAX_TOTAL_BYTES + MULTIPART_OVERHEAD},
+)
+
 # CORS for frontend
 cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
 cors_origins += [
@@ -58,14 +89,57 @@ app.add_middleware(
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    llm_ok = await check_llm_connection()
+    """Liveness: the process is serving; provider status comes from the background monitor."""
     return {
         "status": "healthy",
-        "llm_connected": llm_ok
+        "llm_connected": HEALTH_MONITOR.llm_connected(),
+        "providers": HEALTH_MONITOR.snapshot(),
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until a text provider is reachable and its circuit is not open."""
+    ready = HEALTH_MONITOR.is_ready()
+    return JSONResponse(
+        {"status": "ready" if ready else "not_ready", "llm_connected": ready},
+        status_code=200 if ready else 503,
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latency histograms, LLM calls and tokens, cache, retry and fallback counters."""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+
+async def _spool_pdf_upload(file: UploadFile) -> SpooledPDF:
+    """Validate an uploaded PDF while spooling it to a temp file."""
+    try:
+        return await spool_pdf_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _http_error(e: Exception) -> HTTPException:
+    """Map a pipeline exception to the HTTP error the API reports."""
+    if isinstance(e, ValueError):
+        return HTTPException(status_code=400, detail=str(e))
+    if isinstance(e, (ConnectionError, RuntimeError)):
+        return HTTPException(status_code=503, detail=str(e))
+    logger.exception("Unexpected error during analysis", exc_info=e)
+    return HTTPException(
+        status_code=500,
+        detail="An unexpected error occurred during analysis"
+    )
+
+
+def _sse(event: str, data) -> str:
+    payload = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
 @app.post("/analyze", response_model=AnalysisResult)
 async def analyze_pdf(file: UploadFile = File(...)):
     """
@@ -74,46 +148,174 @@ async def analyze_pdf(file: UploadFile = File(...)):
     Returns biomarker values, status (normal/high/low), explanations,
     and health recommendations.
     """
-    # Validate file type
-    if not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(
-            status_code=400,
-            detail="Only PDF files are supported"
-        )
-
-    # Validate file is not empty
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(
-            status_code=400,
-            detail="Uploaded file is empty"
-        )
-
-    # Validate file size (max 20MB)
-    if len(contents) > 20 * 1024 * 1024:
-        raise HTTPException(
-            status_code=400,
-            detail="File too large. Maximum size is 20MB"
-        )
+    upload = await _spool_pdf_upload(file)
 
     try:
-        logger.info(f"Processing file: {file.filename}")
-        result = await analyze_blood_test(contents)
+        logger.info(f"Processing file: {file.filename} ({upload.size / 1024:.0f} KB)")
+        result = await analyze_blood_test(upload.path, sha256=upload.sha256)
         logger.info("Analysis complete")
         return result
 
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except ConnectionError as e:
-        raise HTTPException(status_code=503, detail=str(e))
-    except RuntimeError as e:
-        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        logger.exception("Unexpected error during analysis")
-        raise HTTPException(
-            status_code=500,
-            detail="An unexpected error occurred during analysis"
-        )
+        raise _http_error(e)
+    finally:
+        upload.close()
+
+
+@app.post("/analyze/stream")
+async def analyze_pdf_stream(file: UploadFile = File(...)):
+    """
+    Same pipeline as /analyze, streamed as Server-Sent Events.
+
+    Emits text_extracted, ocr_progress (scanned PDFs only), biomarker
+    (each LLM-extracted biomarker as soon as it is classified), biomarkers
+    (all values, reference ranges and statuses), analysis (LLM summary and
+    explanations) and result (the full AnalysisResult). Failures are sent
+    as an error event with the HTTP status /analyze would have used.
+    Disconnecting cancels the remaining pipeline stages.
+    """
+    upload = await _spool_pdf_upload(file)
+    logger.info(f"Streaming analysis for file: {file.filename}")
+
+    async def event_stream():
+        try:
+            async for event, data in iter_analysis_events(upload.path, sha256=upload.sha256):
+                yield _sse(event, data)
+        except Exception as e:
+            error = _http_error(e)
+            yield _sse("error", {"status": error.status_code, "detail": error.detail})
+        finally:
+            upload.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/analyze/batch", response_model=BatchAnalysisResult)
+async def analyze_pdf_batch(files: list[UploadFile] = File(...)):
+    """
+    Analyse many blood test PDFs in one request.
+
+    Accepts several `files` parts, each a PDF or a zip archive of PDFs.
+    Identical files are analysed once. Each file gets its own result or
+    error, so one bad report does not fail the batch.
+    """
+    # Results keep upload order; None marks a slot waiting for its analysis
+    items: list[BatchItemResult | None] = []
+    # (slot, filename, spooled path, sha256)
+    documents: list[tuple[int, str, str, str]] = []
+    uploads: list[SpooledPDF] = []
+    try:
+        for file in files:
+            name = file.filename or "upload"
+            try:
+                if name.lower().endswith(".zip"):
+                    # Spooled and unpacked off the event loop; members are spooled to their own files
+                    with await spool_zip_upload(file, BATCH_MAX_TOTAL_BYTES) as archive:
+                        unpacked = await asyncio.to_thread(unpack_zip, archive.path)
+                    members = []
+                    for member_name, member in unpacked:
+                        if isinstance(member, ValueError):
+                            items.append(BatchItemResult(
+                                filename=member_name, status="error", error=str(member), status_code=400
+                            ))
+                        else:
+                            uploads.append(member)
+                            members.append((member_name, member.path, member.sha256))
+                else:
+                    upload = await spool_pdf_upload(file)
+                    uploads.append(upload)
+                    members = [(name, upload.path, upload.sha256)]
+            except ValueError as e:
+                items.append(BatchItemResult(filename=name, status="error", error=str(e), status_code=400))
+                continue
+            for member_name, pdf, digest in members:
+                documents.append((len(items), member_name, pdf, digest))
+                items.append(None)
+
+        if len(documents) > BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many files. Maximum is {BATCH_MAX_FILES} per batch"
+            )
+
+        logger.info(f"Processing batch of {len(documents)} files")
+        outcomes = await analyze_batch([(pdf, digest) for _, _, pdf, digest in documents])
+    finally:
+        for upload in uploads:
+            upload.close()
+
+    for (slot, name, _, _), outcome in zip(documents, outcomes):
+        if isinstance(outcome, Exception):
+            error = _http_error(outcome)
+            items[slot] = BatchItemResult(filename=name, status="error", error=error.detail, status_code=error.status_code)
+        else:
+            items[slot] = BatchItemResult(filename=name, status="ok", result=outcome)
+
+    return BatchAnalysisResult(
+        results=items,
+        unique_files=len({digest for _, _, _, digest in documents}),
+    )
+
+
+@app.post("/jobs", response_model=JobSubmission, status_code=202)
+async def submit_job(request: Request, file: UploadFile = File(...)):
+    """
+    Queue a blood test PDF for background analysis.
+
+    Poll GET /jobs/{job_id} for the state and current stage, then fetch
+    the AnalysisResult from GET /jobs/{job_id}/result.
+    """
+    with await _spool_pdf_upload(file) as upload:
+        contents = await asyncio.to_thread(upload.read_bytes)
+    job_id = await asyncio.to_thread(JOB_STORE.submit, file.filename, contents)
+    request.app.state.job_workers.notify()
+    logger.info(f"Queued job {job_id} for file: {file.filename}")
+    return JobSubmission(
+        job_id=job_id,
+        status="queued",
+        status_url=f"/jobs/{job_id}",
+        result_url=f"/jobs/{job_id}/result",
+    )
+
+
+async def _get_job(job_id: str) -> dict:
+    job = await asyncio.to_thread(JOB_STORE.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """State, current stage, progress and attempts of a job."""
+    job = await _get_job(job_id)
+    return JobStatus(
+        job_id=job["id"],
+        filename=job["filename"],
+        status=job["status"],
+        stage=job["stage"],
+        progress=job["progress"],
+        attempts=job["attempts"],
+        error=job["error"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        finished_at=job["finished_at"],
+    )
+
+
+@app.get("/jobs/{job_id}/result", response_model=AnalysisResult)
+async def get_job_result(job_id: str):
+    """The analysis of a finished job; 409 while it is still queued or running."""
+    job = await _get_job(job_id)
+    if job["status"] == SUCCEEDED:
+        return AnalysisResult.model_validate_json(job["result"])
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=job["status_code"] or 500, detail=job["error"])
+    raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
 
 
 @app.get("/")
@@ -6,13 +6,14 @@ class BiomarkerStatus(str, Enum):
     HIGH = "high"
     CRITICAL = "critical"
     NORMAL = "normal"
+    UNKNOWN = "unknown"  # no reference range in comparable units
 
 class Biomarker(BaseModel):
     name: str
     value: float
     unit: str
-    reference_low: float
-    reference_high: float
+    reference_low: float | None
+    reference_high: float | None
     status: BiomarkerStatus
     explanation: str
     recommendation: str | None
@@ -28,7 +29,62 @@ class ExtractedBiomarker(BaseModel):
     name: str
     value: float
     unit: str
+    reference_low: float | None = None
+    reference_high: float | None = None
 
 class ExtractionResult(BaseModel):
     biomarkers: list[ExtractedBiomarker]
-    raw_text: str = ""
\ No newline at end of file
+    raw_text: str = ""
+
+class TableExtraction(BaseModel):
+    biomarkers: list[ExtractedBiomarker]
+    candidate_rows: int = 0
+    coverage: float = 0.0
+
+class PageLayout(BaseModel):
+    kind: str  # "text", "scanned", "mixed" or "blank"
+    characters: int = 0
+    image_coverage: float = 0.0
+    ocr_dpi: int | None = None  # render resolution when the page needs OCR
+
+class PageImage(BaseModel):
+    data: bytes  # image sent to the vision model
+    mime_type: str = "image/jpeg"
+    width: int
+    height: int
+    rendered_bytes: int  # plain colour JPEG render size (estimated unless OCR_MEASURE_SAVINGS is on)
+
+class PDFScan(BaseModel):
+    text: str
+    page_count: int
+    table: TableExtraction
+    pages: list[PageLayout] = []
+
+class BatchItemResult(BaseModel):
+    filename: str
+    status: str
+    result: AnalysisResult | None = None
+    error: str | None = None
+    status_code: int | None = None
+
+class BatchAnalysisResult(BaseModel):
+    results: list[BatchItemResult]
+    unique_files: int
+
+class JobSubmission(BaseModel):
+    job_id: str
+    status: str
+    status_url: str
+    result_url: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    stage: str | None = None
+    progress: dict = Field(default_factory=dict)
+    attempts: int
+    error: str | None = None
+    created_at: float
+    updated_at: float
+    finished_at: float | None = None
@@ -1,7 +1,9 @@
 import asyncio
-import json
 import logging
-from pathlib import Path
+import time
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+import numpy as np
 from rapidfuzz import process, utils, fuzz
 
 from app.models import (
@@ -9,9 +11,20 @@ from app.models import (
     Biomarker,
     BiomarkerStatus,
     ExtractedBiomarker,
+    PageImage,
 )
-from app.services.pdf_parser import extract_text_from_pdf, extract_biomarkers_regex, normalize_unit, render_page_as_image, get_page_count
-from app.services.llm_service import extract_biomarkers_llm, analyze_biomarkers, ocr_page_image
+from app.services.pdf_parser import PDFSource, extract_biomarkers_regex, normalize_unit
+from app.services.pdf_executor import scan_pdf_async, render_pages_async
+from app.services.llm_service import extract_biomarkers_llm, extract_biomarkers_llm_stream, analyze_biomarkers, ocr_page_image, prompt_version
+from app.services.cache import LRUCache, TieredCache
+from app.services.chunking import PAGE_BREAK
+from app.services.classifier import UNKNOWN, classify, detect_sex
+from app.services.explanations import learn_explanations, lookup_explanations
+from app.services.metrics import COALESCED_REQUESTS, FALLBACKS, OCR_IMAGE_BYTES, REFERENCE_LOOKUPS, observe_stage, stage_timer
+from app.services.providers import OCR_ROUTER, TEXT_ROUTER
+from app.services.singleflight import SingleFlight
+from app.services.uploads import content_hash, pinned_pdf
+from app.services.reference_data import REFERENCE_RANGES
 import os
 from dotenv import load_dotenv
 
@@ -19,10 +32,35 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-ENABLE_REGEX_EXTRACTION = os.getenv("ENABLE_REGEX_EXTRACTION", "false").lower() == "true"
+# Async generator mapping report text to LLM-extracted biomarkers
+LLMExtractor = Callable[[str], AsyncIterator[ExtractedBiomarker]]
 
-DATA_DIR = Path(__file__).parent.parent / "data"
-REFERENCE_RANGES = json.loads((DATA_DIR / "reference_ranges.json").read_text())
+ENABLE_REGEX_EXTRACTION = os.getenv("ENABLE_REGEX_EXTRACTION", "true").lower() == "true"
+
+# Stream the extraction completion and classify biomarkers as they arrive
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+
+OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "4"))
+# Refuse documents with more pages needing OCR than this (0: no limit)
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "30"))
+
+# Skip LLM extraction when the layout-aware table parser explains this share of result rows
+TABLE_COVERAGE_THRESHOLD = float(os.getenv("TABLE_COVERAGE_THRESHOLD", "0.85"))
+TABLE_MIN_BIOMARKERS = int(os.getenv("TABLE_MIN_BIOMARKERS", "3"))
+
+# Content-addressed cache of full analysis results
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE = TieredCache(
+    "analysis_result",
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    disk_enabled=os.getenv("RESULT_CACHE_DISK", "true").lower() == "true",
+)
+
+# Concurrent analyses of identical content (double submits, client retries) share one run
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+ANALYSIS_FLIGHTS = SingleFlight("analysis", on_join=COALESCED_REQUESTS.inc)
 
 # Pre-compute search map for faster lookups and better fuzzy matching
 def _build_search_map():
@@ -43,30 +81,66 @@ def _build_search_map():
 SEARCH_MAP = _build_search_map()
 SEARCH_CHOICES = list(SEARCH_MAP.keys())
 
-def find_reference_range(biomarker_name: str) -> dict | None:
-    name_clean = utils.default_process(biomarker_name)
-    if not name_clean:
-        return None
-
-    # 1. Direct match on processed names for speed
-    if name_clean in SEARCH_MAP:
-        return _get_ref_data(SEARCH_MAP[name_clean])
-
-    # 2. Fuzzy match using WRatio (better for varying word orders and partial matches)
-    match = process.extractOne(
-        name_clean, 
-        SEARCH_CHOICES, 
-        scorer=fuzz.WRatio, 
-        score_cutoff=85
-    )
-    
-    if match:
-        best_match_key, score, _ = match
-        original_key = SEARCH_MAP[best_match_key]
-        logger.info(f"Fuzzy matched '{biomarker_name}' to '{original_key}' (score: {score:.1f})")
-        return _get_ref_data(original_key)
+# Fuzzy matches below this WRatio score are treated as unknown biomarkers
+FUZZY_SCORE_CUTOFF = 85
+# Raw name -> reference key ("" for a remembered miss); reference data is static, so no expiry
+RESOLVER_CACHE = LRUCache(max_entries=int(os.getenv("RESOLVER_CACHE_SIZE", "4096")), ttl=float("inf"))
+# Below this many unmatched names the thread start-up outweighs a parallel cdist
+RESOLVER_PARALLEL_MIN = 8
+
 
-    return None
+def resolve_reference_keys(names: list[str]) -> list[str | None]:
+    """
+    Map biomarker names to reference keys (None when nothing matches).
+
+    Repeat names, including misses, are answered from RESOLVER_CACHE;
+    exact matches on the processed name are looked up directly, and the
+    remaining names are scored together in one `process.cdist` call.
+    """
+    resolved: dict[str, str | None] = {}
+    pending: dict[str, str] = {}
+    for name in names:
+        if name in resolved or name in pending:
+            continue
+        cached = RESOLVER_CACHE.get(name)
+        if cached is not None:
+            resolved[name] = cached or None
+            REFERENCE_LOOKUPS.labels(result="cached").inc()
+            continue
+        name_clean = utils.default_process(name)
+        if name_clean and name_clean not in SEARCH_MAP:
+            pending[name] = name_clean
+            continue
+        resolved[name] = SEARCH_MAP.get(name_clean) if name_clean else None
+        RESOLVER_CACHE.set(name, resolved[name] or "")
+        REFERENCE_LOOKUPS.labels(result="exact" if resolved[name] else "miss").inc()
+
+    if pending:
+        # WRatio handles varying word orders and partial matches
+        scores = process.cdist(
+            list(pending.values()),
+            SEARCH_CHOICES,
+            scorer=fuzz.WRatio,
+            score_cutoff=FUZZY_SCORE_CUTOFF,
+            workers=-1 if len(pending) >= RESOLVER_PARALLEL_MIN else 1,
+        )
+        best = scores.argmax(axis=1)
+        for row, name in enumerate(pending):
+            score = scores[row, best[row]]
+            key = None
+            if score >= FUZZY_SCORE_CUTOFF:
+                key = SEARCH_MAP[SEARCH_CHOICES[best[row]]]
+                logger.info(f"Fuzzy matched '{name}' to '{key}' (score: {score:.1f})")
+            REFERENCE_LOOKUPS.labels(result="fuzzy" if key else "miss").inc()
+            resolved[name] = key
+            RESOLVER_CACHE.set(name, key or "")
+
+    return [resolved[name] for name in names]
+
+
+def find_reference_range(biomarker_name: str) -> dict | None:
+    key = resolve_reference_keys([biomarker_name])[0]
+    return _get_ref_data(key) if key else None
 
 def _get_ref_data(key: str) -> dict:
     ref = REFERENCE_RANGES[key]
@@ -78,73 +152,357 @@ def _get_ref_data(key: str) -> dict:
         "description": ref["description"]
     }
 
-def determine_status(value: float, ref_low: float, ref_high: float) -> BiomarkerStatus:
-    if value < ref_low:
-        return BiomarkerStatus.LOW
-    elif value > ref_high:
-        return BiomarkerStatus.HIGH
-    return BiomarkerStatus.NORMAL
+# Unmatched names at least this similar (fuzz.ratio) are the same biomarker
+DUPLICATE_NAME_CUTOFF = 90
 
-def merge_biomarkers(regex_results: list[ExtractedBiomarker], llm_results: list[ExtractedBiomarker]) -> list[ExtractedBiomarker]:
-    merged = list(regex_results)
-    
-    for llm_b in llm_results:
-        llm_name_clean = utils.default_process(llm_b.name)
-        if not llm_name_clean:
-            continue
-            
-        # Check for fuzzy match in already merged biomarkers
-        is_duplicate = False
-        for existing_b in merged:
-            existing_name_clean = utils.default_process(existing_b.name)
-            if existing_name_clean == llm_name_clean:
-                is_duplicate = True
-                break
-            
-            # Fuzzy check for very similar names
-            score = fuzz.ratio(existing_name_clean, llm_name_clean)
-            if score >= 90:
-                is_duplicate = True
-                break
-        
-        if not is_duplicate:
-            merged.append(llm_b)
-    
-    return merged
 
-async def analyze_blood_test(pdf_bytes: bytes) -> AnalysisResult:
+class BiomarkerIndex:
+    """
+    Merged biomarkers, deduplicated by canonical reference key.
+
+    Names with a reference entry are duplicates when they resolve to the
+    same key; names without one fall back to near-identical spelling,
+    scored for a whole batch in one similarity matrix.
+    """
+
+    def __init__(self):
+        self.biomarkers: list[ExtractedBiomarker] = []
+        self._keys: set[str] = set()
+        self._unmatched_names: list[str] = []
+
+    def add_all(self, biomarkers: list[ExtractedBiomarker]) -> list[ExtractedBiomarker]:
+        """Add the biomarkers that are not duplicates; returns the ones added."""
+        keys = resolve_reference_keys([b.name for b in biomarkers])
+        names = [utils.default_process(b.name) for b in biomarkers]
+        unmatched = [name for name, key in zip(names, keys) if key is None and name]
+
+        # Columns: names already indexed, then this batch in order
+        known = len(self._unmatched_names)
+        scores = None
+        if unmatched:
+            scores = process.cdist(
+                unmatched,
+                self._unmatched_names + unmatched,
+                scorer=fuzz.ratio,
+                score_cutoff=DUPLICATE_NAME_CUTOFF,
+                dtype=np.uint8,
+            )
+
+        added = []
+        accepted: list[int] = []
+        row = 0
+        for biomarker, name, key in zip(biomarkers, names, keys):
+            if not name:
+                continue
+            if key is not None:
+                if key in self._keys:
+                    continue
+                self._keys.add(key)
+            else:
+                duplicate = scores[row, :known].any() or scores[row, [known + i for i in accepted]].any()
+                row += 1
+                if duplicate:
+                    continue
+                accepted.append(row - 1)
+                self._unmatched_names.append(name)
+            self.biomarkers.append(biomarker)
+            added.append(biomarker)
+        return added
+
+    def add(self, biomarker: ExtractedBiomarker) -> bool:
+        return bool(self.add_all([biomarker]))
+
+
+def match_explanations(names: list[str], explanations: list[dict]) -> list[dict]:
+    """
+    Pair each biomarker name with its LLM explanation ({} when none matches).
+
+    Matches on canonical reference key, then on the processed name, and
+    scores whatever is left against the explanation names in one matrix.
+    """
+    exp_names = [utils.default_process(exp.get("name", "")) for exp in explanations]
+    exp_keys = resolve_reference_keys([exp.get("name", "") for exp in explanations])
+    by_key = {}
+    by_name = {}
+    for exp, name, key in zip(explanations, exp_names, exp_keys):
+        if key is not None:
+            by_key.setdefault(key, exp)
+        by_name.setdefault(name, exp)
+
+    matched: list[dict] = []
+    unmatched: dict[int, str] = {}
+    for i, (name, key) in enumerate(zip(names, resolve_reference_keys(names))):
+        name_clean = utils.default_process(name)
+        exp = by_key.get(key) if key is not None else None
+        if exp is None:
+            exp = by_name.get(name_clean)
+        if exp is None and name_clean and explanations:
+            unmatched[i] = name_clean
+        matched.append(exp or {})
+
+    if unmatched:
+        scores = process.cdist(
+            list(unmatched.values()), exp_names, scorer=fuzz.WRatio, score_cutoff=FUZZY_SCORE_CUTOFF
+        )
+        best = scores.argmax(axis=1)
+        for row, i in enumerate(unmatched):
+            if scores[row, best[row]] >= FUZZY_SCORE_CUTOFF:
+                matched[i] = explanations[best[row]]
+    return matched
+
+
+def result_cache_key(sha256: str) -> str:
+    """Cache key: PDF content hash + text and OCR provider/model chains + prompt template version."""
+    return f"{sha256}:{TEXT_ROUTER.fingerprint()}:{OCR_ROUTER.fingerprint()}:{prompt_version()}"
+
+
+async def analyze_blood_test(
+    pdf: PDFSource, extractor: LLMExtractor | None = None, sha256: str | None = None
+) -> AnalysisResult:
+    """
+    Analyse a PDF, serving repeat uploads of identical bytes from the result cache.
+
+    `pdf` is the PDF bytes or the path of a spooled upload; pass `sha256`
+    when the content hash is already known (uploads hash while streaming).
+    `extractor` replaces the per-document LLM extraction call (the batch
+    endpoint uses it to pack several reports into one request).
+    """
+    async for event, data in iter_analysis_events(pdf, extractor, sha256):
+        if event == "result":
+            return data
+    raise RuntimeError("Analysis pipeline ended without a result")
+
+
+async def iter_analysis_events(
+    pdf: PDFSource, extractor: LLMExtractor | None = None, sha256: str | None = None
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Run the pipeline, yielding (event, data) as each stage completes.
+
+    Events: text_extracted, ocr_progress, biomarker, biomarkers, analysis and finally
+    result, whose data is the AnalysisResult. stage_failed reports an LLM
+    stage that fell back to a degraded answer. A result cache hit yields
+    only the result event.
+
+    Calls for content that is already being analysed attach to that run:
+    they replay its events so far, follow it live and end with the same
+    result or error.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        async for item in _analysis_events(pdf, extractor, sha256):
+            yield item
+        return
+
+    if sha256 is None:
+        sha256 = await asyncio.to_thread(content_hash, pdf)
+
+    async def run() -> AsyncIterator[tuple[str, Any]]:
+        # The run can outlive the request whose spooled upload it reads
+        with pinned_pdf(pdf) as source:
+            async for item in _analysis_events(source, extractor, sha256):
+                yield item
+
+    async for item in ANALYSIS_FLIGHTS.stream(sha256, run):
+        yield item
+
+
+async def _analysis_events(
+    pdf: PDFSource, extractor: LLMExtractor | None, sha256: str | None
+) -> AsyncIterator[tuple[str, Any]]:
+    """The pipeline behind a result cache lookup, without coalescing."""
+    cache_key = None
+    if RESULT_CACHE_ENABLED:
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(content_hash, pdf)
+        cache_key = result_cache_key(sha256)
+        cached = await asyncio.to_thread(RESULT_CACHE.get, cache_key)
+        if cached is not None:
+            logger.info(f"Result cache hit for {cache_key[:16]}")
+            yield "result", AnalysisResult.model_validate_json(cached)
+            return
+
+    start = time.perf_counter()
+    async for event, data in _run_analysis(pdf, extractor or _iter_llm_biomarkers):
+        if event == "result":
+            observe_stage("pipeline", time.perf_counter() - start)
+            result, cacheable = data["result"], data["cacheable"]
+            if cache_key and cacheable:
+                await asyncio.to_thread(RESULT_CACHE.set, cache_key, result.model_dump_json())
+            data = result
+        yield event, data
+
+
+async def _iter_ocr_pages(pdf: PDFSource, page_dpis: dict[int, int]) -> AsyncIterator[tuple[int, str, PageImage]]:
+    """
+    OCR pages concurrently, yielding (page_num, text, image) as each page finishes.
+
+    `page_dpis` maps each page to its render resolution. Pages are rendered
+    in batches of OCR_MAX_CONCURRENCY (one document open per batch) so OCR
+    of early pages overlaps rendering of later ones.
+    """
+    page_nums = list(page_dpis)
+    semaphore = asyncio.Semaphore(OCR_MAX_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue()
+    tasks: list[asyncio.Task] = []
+
+    async def ocr_page(page_num: int, img: PageImage) -> None:
+        try:
+            async with semaphore:
+                logger.info(f"OCR processing page {page_num + 1}...")
+                # Pages run under the shared Gemini rate limiter
+                with stage_timer("ocr_page"):
+                    text = await ocr_page_image(img.data, img.mime_type)
+        except Exception as e:
+            # The consumer counts one result per page, so a failure must arrive as one too
+            await results.put(e)
+            return
+        await results.put((page_num, text, img))
+
+    async def render_batches() -> None:
+        try:
+            for i in range(0, len(page_nums), OCR_MAX_CONCURRENCY):
+                batch = page_nums[i:i + OCR_MAX_CONCURRENCY]
+                start = time.perf_counter()
+                images = await render_pages_async(pdf, batch, [page_dpis[n] for n in batch])
+                per_page = (time.perf_counter() - start) / len(batch)
+                for img in images:
+                    observe_stage("page_render", per_page)
+                    OCR_IMAGE_BYTES.labels(kind="sent").inc(len(img.data))
+                    OCR_IMAGE_BYTES.labels(kind="rendered").inc(img.rendered_bytes)
+                tasks.extend(asyncio.create_task(ocr_page(n, img)) for n, img in zip(batch, images))
+                del images
+        except Exception as e:
+            await results.put(e)
+
+    producer = asyncio.create_task(render_batches())
+    try:
+        for _ in page_nums:
+            item = await results.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Also reached when the consumer goes away (e.g. a streaming client disconnects)
+        producer.cancel()
+        for task in tasks:
+            task.cancel()
+
+
+async def _iter_llm_biomarkers(raw_text: str) -> AsyncIterator[ExtractedBiomarker]:
+    if LLM_STREAMING:
+        async for biomarker in extract_biomarkers_llm_stream(raw_text):
+            yield biomarker
+    else:
+        for biomarker in await extract_biomarkers_llm(raw_text):
+            yield biomarker
+
+
+def _build_analysis_entries(biomarkers: list[ExtractedBiomarker], sex: str | None = None) -> list[dict]:
+    """
+    Resolve and classify many biomarkers in one batch.
+
+    Values are converted to the reference unit and compared with the
+    sex-specific range; a range printed by the lab is used as-is, in the
+    units the lab reported.
+    """
+    if not biomarkers:
+        return []
+    start = time.perf_counter()
+    keys = resolve_reference_keys([b.name for b in biomarkers])
+    result = classify(
+        keys,
+        [b.value for b in biomarkers],
+        [b.unit for b in biomarkers],
+        sex=sex,
+        lab_low=[b.reference_low for b in biomarkers],
+        lab_high=[b.reference_high for b in biomarkers],
+    )
+
+    entries = []
+    for i, (biomarker, key) in enumerate(zip(biomarkers, keys)):
+        status = str(result.status[i])
+        if key:
+            description = REFERENCE_RANGES[key]["description"]
+        elif status != UNKNOWN:
+            description = "Reference range as printed on the lab report"
+        else:
+            description = "Reference range not available"
+        known = status != UNKNOWN
+        entries.append({
+            "name": biomarker.name,
+            # Trim conversion noise (e.g. 5.4 mmol/L -> 97.2864 mg/dL)
+            "value": float(f"{result.value[i]:.6g}"),
+            "unit": result.unit[i],
+            "reference_low": float(result.reference_low[i]) if known else None,
+            "reference_high": float(result.reference_high[i]) if known else None,
+            "status": status,
+            "description": description
+        })
+    observe_stage("reference_matching", time.perf_counter() - start)
+    return entries
+
+
+async def _run_analysis(pdf: PDFSource, extractor: LLMExtractor) -> AsyncIterator[tuple[str, Any]]:
     """
     Full analysis pipeline:
     1. Extract text from PDF
     2. Extract biomarkers (regex + LLM fallback)
     3. Compare to reference ranges
     4. Generate explanations and recommendations via LLM
+
+    Yields stage events; the final "result" event carries the result and
+    whether it is complete enough to cache.
     """
-    # Step 1: Extract text
+    # Step 1: Extract text and tables (one open of the document)
     logger.info("Extracting text from PDF...")
-    raw_text = extract_text_from_pdf(pdf_bytes)
+    with stage_timer("text_extraction"):
+        scan = await scan_pdf_async(pdf)
+    raw_text, total_pages, table = scan.text, scan.page_count, scan.table
 
-    # If no text found, use vision OCR for scanned/image-based PDFs
-    if not raw_text.strip():
-        logger.info("No text found, using vision OCR for scanned PDF...")
-        total_pages = get_page_count(pdf_bytes)
-        max_pages = min(total_pages, 5)
-        logger.info(f"OCR processing {max_pages} of {total_pages} pages...")
-        ocr_parts = []
-        for i in range(max_pages):
-            logger.info(f"OCR processing page {i + 1}/{max_pages}...")
-            img = render_page_as_image(pdf_bytes, i)
-            page_text = await ocr_page_image(img)
-            if page_text:
-                ocr_parts.append(page_text)
-            del img  # Free memory immediately
-            if i < max_pages - 1:
-                await asyncio.sleep(5)  # Pause between pages to avoid rate limits
-        raw_text = "\n".join(ocr_parts)
+    # Vision OCR only for pages without a usable text layer (scanned) or with results in images (mixed)
+    page_dpis = {n: layout.ocr_dpi for n, layout in enumerate(scan.pages) if layout.ocr_dpi}
+    if page_dpis:
+        if OCR_MAX_PAGES and len(page_dpis) > OCR_MAX_PAGES:
+            raise ValueError(
+                f"Too many scanned pages ({len(page_dpis)}). Maximum is {OCR_MAX_PAGES} pages needing OCR"
+            )
+        kinds = [layout.kind for layout in scan.pages]
+        logger.info(
+            f"OCR processing {len(page_dpis)} of {total_pages} pages "
+            f"({kinds.count('scanned')} scanned, {kinds.count('mixed')} mixed, {kinds.count('text')} text)..."
+        )
+        page_texts = raw_text.split(PAGE_BREAK)
+        completed = 0
+        ocr_start = time.perf_counter()
+        async for page_num, text, image in _iter_ocr_pages(pdf, page_dpis):
+            completed += 1
+            # A mixed page keeps its own text layer if OCR came back empty
+            if text.strip():
+                page_texts[page_num] = text
+            yield "ocr_progress", {
+                "page": page_num + 1,
+                "completed": completed,
+                "total": len(page_dpis),
+                "characters": len(text),
+                "image_bytes": len(image.data),
+                # Estimated unless OCR_MEASURE_SAVINGS is on
+                "bytes_saved": image.rendered_bytes - len(image.data),
+            }
+        observe_stage("ocr", time.perf_counter() - ocr_start)
+        raw_text = PAGE_BREAK.join(text for text in page_texts if text.strip())
 
     if not raw_text.strip():
         raise ValueError("Could not extract text from PDF. The file may be image-based or corrupted.")
+    yield "text_extracted", {
+        "pages": total_pages,
+        "characters": len(raw_text),
+        "ocr": bool(page_dpis),
+        "ocr_pages": len(page_dpis),
+    }
     
+    # Sex-specific reference ranges apply when the report states the patient's sex
+    sex = detect_sex(raw_text)
+
     # Step 2: Extract biomarkers
     if ENABLE_REGEX_EXTRACTION:
         logger.info("Extracting biomarkers with regex...")
@@ -154,65 +512,92 @@ async def analyze_blood_test(pdf_bytes: bytes) -> AnalysisResult:
         logger.info("Regex extraction disabled, skipping...")
         regex_biomarkers = []
     
-    # Use LLM for additional extraction
-    logger.info("Using LLM for comprehensive extraction...")
-    try:
-        llm_biomarkers = await extract_biomarkers_llm(raw_text)
-        # Normalize units for LLM results
-        for b in llm_biomarkers:
+    table_biomarkers = []
+    use_table = table.coverage >= TABLE_COVERAGE_THRESHOLD and len(table.biomarkers) >= TABLE_MIN_BIOMARKERS
+    if use_table:
+        table_biomarkers = table.biomarkers
+        for b in table_biomarkers:
             b.unit = normalize_unit(b.unit)
-        logger.info(f"LLM found {len(llm_biomarkers)} biomarkers")
-    except Exception as e:
-        logger.warning(f"LLM extraction failed or timed out: {e}. Proceeding with regex results only.")
-        llm_biomarkers = []
-    
-    # Merge results
-    all_biomarkers = merge_biomarkers(regex_biomarkers, llm_biomarkers)
+
+    # Merge results (table rows first: they carry the lab-printed reference ranges)
+    index = BiomarkerIndex()
+    index.add_all(table_biomarkers)
+    all_biomarkers = index.biomarkers
+
+    # Step 3: Compare to reference ranges
+    biomarkers_for_analysis = _build_analysis_entries(all_biomarkers, sex)
+
+    if use_table and not page_dpis:
+        # Digitally generated tabular report: the layout parse is complete, no LLM round trip needed
+        logger.info(
+            f"Table parser found {len(table.biomarkers)} biomarkers "
+            f"(coverage {table.coverage:.0%}), skipping LLM extraction"
+        )
+        extraction_ok = True
+    else:
+        # Use LLM for additional extraction; each streamed biomarker is
+        # matched and classified while the model is still generating
+        logger.info(f"Table coverage {table.coverage:.0%}, using LLM for comprehensive extraction...")
+        llm_count = 0
+        extraction_start = time.perf_counter()
+        try:
+            async for b in extractor(raw_text):
+                llm_count += 1
+                # Normalize units for LLM results
+                b.unit = normalize_unit(b.unit)
+                if not index.add(b):
+                    continue
+                entry = _build_analysis_entries([b], sex)[0]
+                biomarkers_for_analysis.append(entry)
+                yield "biomarker", entry
+            observe_stage("llm_extraction", time.perf_counter() - extraction_start)
+            logger.info(f"LLM found {llm_count} biomarkers")
+            extraction_ok = llm_count > 0
+        except Exception as e:
+            observe_stage("llm_extraction", time.perf_counter() - extraction_start)
+            logger.warning(f"LLM extraction failed or timed out: {e}. Proceeding with regex results only.")
+            extraction_ok = False
+            FALLBACKS.labels(stage="llm_extraction").inc()
+            yield "stage_failed", {"stage": "llm_extraction", "error": str(e)}
+
+    # Regex hits only fill in what the table and the LLM did not report, so a
+    # conflicting value elsewhere in the text never overrides an LLM result
+    biomarkers_for_analysis.extend(_build_analysis_entries(index.add_all(regex_biomarkers), sex))
+
     logger.info(f"Total unique biomarkers: {len(all_biomarkers)}")
-    
+
     if not all_biomarkers:
         raise ValueError("No biomarkers could be extracted from the PDF.")
-    
-    # Step 3: Compare to reference ranges
-    biomarkers_for_analysis = []
-    for biomarker in all_biomarkers:
-        ref = find_reference_range(biomarker.name)
-        if ref:
-            value = biomarker.value
-            # Basic unit conversion (e.g., g/L to g/dL for hemoglobin/protein)
-            if biomarker.unit == "g/L" and ref["unit"] == "g/dL":
-                value = value / 10.0
-            elif biomarker.unit == "g/dL" and ref["unit"] == "g/L":
-                value = value * 10.0
-                
-            status = determine_status(value, ref["low"], ref["high"])
-            biomarkers_for_analysis.append({
-                "name": biomarker.name,
-                "value": value,
-                "unit": ref["unit"],
-                "reference_low": ref["low"],
-                "reference_high": ref["high"],
-                "status": status.value,
-                "description": ref["description"]
-            })
-        else:
-            # Unknown biomarker - include without reference
-            biomarkers_for_analysis.append({
-                "name": biomarker.name,
-                "value": biomarker.value,
-                "unit": biomarker.unit,
-                "reference_low": None,
-                "reference_high": None,
-                "status": "unknown",
-                "description": "Reference range not available"
-            })
-    
-    # Step 4: Generate analysis via LLM
+
+    yield "biomarkers", {"biomarkers": biomarkers_for_analysis}
+
+    # Step 4: Generate analysis via LLM; results with a local explanation are sent as context only
     logger.info("Generating analysis with LLM...")
+    keys = resolve_reference_keys([b["name"] for b in biomarkers_for_analysis])
+    library = await asyncio.to_thread(
+        lookup_explanations, [(key, b["status"]) for key, b in zip(keys, biomarkers_for_analysis)]
+    )
+    local = {b["name"]: exp for b, exp in zip(biomarkers_for_analysis, library) if exp}
+    llm_ok = extraction_ok
+    failed_stage = None
     try:
-        analysis = await analyze_biomarkers(biomarkers_for_analysis)
+        with stage_timer("llm_analysis"):
+            analysis = await analyze_biomarkers(biomarkers_for_analysis, local.keys())
+        provider = analysis.pop("provider", None)
+        # Failover/hedge answers serve this report but do not become library entries
+        if TEXT_ROUTER.is_primary(provider):
+            pending = [(b, key) for b, key in zip(biomarkers_for_analysis, keys) if b["name"] not in local]
+            matched = match_explanations([b["name"] for b, _ in pending], analysis.get("biomarker_explanations", []))
+            await asyncio.to_thread(
+                learn_explanations, [(key, b["status"], exp) for (b, key), exp in zip(pending, matched)]
+            )
+        else:
+            logger.info(f"Analysis answered by {provider}, not the primary provider; explanations not learned")
     except Exception as e:
         logger.error(f"LLM analysis failed or timed out: {e}")
+        llm_ok = False
+        FALLBACKS.labels(stage="llm_analysis").inc()
+        failed_stage = {"stage": "llm_analysis", "error": str(e)}
         analysis = {
             "summary": "AI analysis could not be completed due to a service timeout. Please review the extracted biomarkers below.",
             "biomarker_explanations": [],
@@ -220,39 +605,30 @@ async def analyze_blood_test(pdf_bytes: bytes) -> AnalysisResult:
             "recommendations": ["Consult with a healthcare provider regarding your results."]
         }
     
+    analysis["biomarker_explanations"] = [
+        *({"name": name, **exp} for name, exp in local.items()),
+        *analysis.get("biomarker_explanations", []),
+    ]
+
+    if failed_stage:
+        yield "stage_failed", failed_stage
+    yield "analysis", analysis
+
     # Step 5: Build final result
-    # Use fuzzy matching to map explanations back to biomarkers
+    # Map explanations back to biomarkers by reference key, then by name
     explanation_list = analysis.get("biomarker_explanations", [])
-    explanation_names = [utils.default_process(exp["name"]) for exp in explanation_list]
-    
+    explanations = match_explanations([b["name"] for b in biomarkers_for_analysis], explanation_list)
+
     final_biomarkers = []
-    for b in biomarkers_for_analysis:
-        b_name_clean = utils.default_process(b["name"])
-        exp = {}
-        
-        # Try exact match first
-        if b_name_clean in explanation_names:
-            idx = explanation_names.index(b_name_clean)
-            exp = explanation_list[idx]
-        else:
-            # Fuzzy match
-            match = process.extractOne(b_name_clean, explanation_names, score_cutoff=85)
-            if match:
-                _, _, idx = match
-                exp = explanation_list[idx]
-        
-        # Handle unknown reference ranges
-        ref_low = b["reference_low"] if b["reference_low"] is not None else 0
-        ref_high = b["reference_high"] if b["reference_high"] is not None else 999
-        status = BiomarkerStatus(b["status"]) if b["status"] != "unknown" else BiomarkerStatus.NORMAL
-        
+    for b, exp in zip(biomarkers_for_analysis, explanations):
+        # Unknown results keep no range and an "unknown" status rather than passing as normal
         final_biomarkers.append(Biomarker(
             name=b["name"].title(),
             value=b["value"],
             unit=b["unit"],
-            reference_low=ref_low,
-            reference_high=ref_high,
-            status=status,
+            reference_low=b["reference_low"],
+            reference_high=b["reference_high"],
+            status=BiomarkerStatus(b["status"]),
             explanation=exp.get("explanation", b["description"]),
             recommendation=exp.get("recommendation")
         ))
@@ -263,11 +639,13 @@ async def analyze_blood_test(pdf_bytes: bytes) -> AnalysisResult:
     if concerns and isinstance(concerns[0], dict):
         concerns = [c.get("name", str(c)) for c in concerns]
 
-    return AnalysisResult(
+    result = AnalysisResult(
         summary=analysis.get("summary", "Analysis complete. Review your results below."),
         biomarkers=final_biomarkers,
         concerns=concerns,
         recommendations=analysis.get("recommendations", []),
         disclaimer="This analysis is for informational purposes only and is not a substitute for professional medical advice, diagnosis, or treatment. Always consult with a qualified healthcare provider about any questions you may have regarding your health or medical results."
     )
+    # Degraded results (LLM fallbacks) are not cached so the next upload retries
+    yield "result", {"result": result, "cacheable": llm_ok and bool(explanation_list)}
 
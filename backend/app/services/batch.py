@@ -0,0 +1,173 @@
+"""Batch analysis of many PDFs with deduplication, packing and bounded concurrency."""
+
+import asyncio
+import logging
+import os
+import zipfile
+import zlib
+from collections.abc import AsyncIterator
+from dotenv import load_dotenv
+
+from app.models import AnalysisResult, ExtractedBiomarker
+from app.services.chunking import extraction_chunks
+from app.services.analyzer import analyze_blood_test
+from app.services.llm_service import extract_biomarkers_llm, extract_biomarkers_llm_batch
+from app.services.metrics import FALLBACKS
+from app.services.pdf_parser import PDFSource
+from app.services.uploads import MAX_UPLOAD_BYTES, SpooledPDF, spool_stream
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "50"))
+BATCH_MAX_TOTAL_BYTES = int(os.getenv("BATCH_MAX_TOTAL_BYTES", str(200 * 1024 * 1024)))
+# Documents in flight at once (bounds parse/OCR memory and CPU)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Packed extraction requests in flight at once
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "2"))
+# Character budget per packed extraction prompt, and how long to wait for more reports
+BATCH_PACK_CHARS = int(os.getenv("BATCH_PACK_CHARS", "16000"))
+BATCH_PACK_WINDOW = float(os.getenv("BATCH_PACK_WINDOW", "0.25"))
+
+
+class ExtractionPacker:
+    """
+    Micro-batches LLM extraction requests from concurrently running pipelines.
+
+    Each pipeline awaits `extract(raw_text)` as its extractor; requests are
+    collected for BATCH_PACK_WINDOW seconds (or until BATCH_PACK_CHARS is
+    reached) and sent as one packed prompt. A pack that cannot be parsed
+    falls back to one extraction call per report. Reports longer than one
+    extraction chunk are not packed.
+    """
+
+    def __init__(self):
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._pending_chars = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._semaphore = asyncio.Semaphore(BATCH_LLM_CONCURRENCY)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def extract(self, raw_text: str) -> AsyncIterator[ExtractedBiomarker]:
+        chunks = extraction_chunks(raw_text)
+        if len(chunks) != 1:
+            # Too long to share a prompt: map-reduce the report's own chunks
+            for biomarker in await extract_biomarkers_llm(raw_text):
+                yield biomarker
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((chunks[0], future))
+        self._pending_chars += len(chunks[0])
+        if self._pending_chars >= BATCH_PACK_CHARS:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(BATCH_PACK_WINDOW, self._flush)
+
+        for biomarker in await future:
+            yield biomarker
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pack, self._pending, self._pending_chars = self._pending, [], 0
+        if pack:
+            task = asyncio.create_task(self._run_pack(pack))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_pack(self, pack: list[tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in pack]
+        async with self._semaphore:
+            try:
+                if len(pack) == 1:
+                    results = [await extract_biomarkers_llm(texts[0])]
+                else:
+                    results = await extract_biomarkers_llm_batch(texts)
+            except Exception as e:
+                logger.warning(f"Packed extraction of {len(pack)} reports failed ({e}), extracting individually")
+                FALLBACKS.labels(stage="batch_pack").inc()
+                results = await asyncio.gather(
+                    *(extract_biomarkers_llm(text) for text in texts), return_exceptions=True
+                )
+
+        for (_, future), result in zip(pack, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def unpack_zip(zip_path: str) -> list[tuple[str, SpooledPDF | ValueError]]:
+    """
+    Spool the PDF members of a zip archive to temp files, checking the size
+    limits before decompressing each one. A member that cannot be
+    decompressed (CRC mismatch, forged size) comes back with a ValueError
+    in place of its file. Blocking: run it off the event loop.
+    """
+    try:
+        archive = zipfile.ZipFile(zip_path)
+    except zipfile.BadZipFile:
+        raise ValueError("Uploaded zip archive is corrupted")
+
+    files = []
+    total = 0
+    try:
+        with archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                    continue
+                if info.file_size > MAX_UPLOAD_BYTES:
+                    raise ValueError(f"{info.filename} is too large. Maximum size is {MAX_UPLOAD_BYTES // (1024 * 1024)}MB")
+                if len(files) >= BATCH_MAX_FILES:
+                    raise ValueError(f"Too many files. Maximum is {BATCH_MAX_FILES} per batch")
+                total += info.file_size
+                if total > BATCH_MAX_TOTAL_BYTES:
+                    raise ValueError("Batch too large once decompressed")
+                name = os.path.basename(info.filename)
+                try:
+                    with archive.open(info) as member:
+                        files.append((name, spool_stream(member)))
+                except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                    logger.warning(f"Unreadable zip member {info.filename}: {e}")
+                    files.append((name, ValueError(f"{name} is corrupted inside the zip archive")))
+    except BaseException:
+        for _, member in files:
+            if isinstance(member, SpooledPDF):
+                member.close()
+        raise
+    return files
+
+
+async def analyze_batch(documents: list[tuple[PDFSource, str]]) -> list[AnalysisResult | Exception]:
+    """
+    Analyse many (pdf, sha256) documents, returning a result or the raised error per document.
+
+    Identical files are analysed once; the per-document pipelines run
+    with at most BATCH_MAX_CONCURRENCY in flight (PDF parsing spreads over
+    the worker pool) and share one ExtractionPacker for LLM extraction.
+    """
+    unique: dict[str, PDFSource] = {}
+    hashes = []
+    for pdf, digest in documents:
+        hashes.append(digest)
+        unique.setdefault(digest, pdf)
+    logger.info(f"Batch of {len(documents)} files, {len(unique)} unique")
+
+    packer = ExtractionPacker()
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run(pdf: PDFSource, digest: str) -> AnalysisResult:
+        async with semaphore:
+            return await analyze_blood_test(pdf, extractor=packer.extract, sha256=digest)
+
+    outcomes = await asyncio.gather(*(run(pdf, digest) for digest, pdf in unique.items()), return_exceptions=True)
+    by_hash = dict(zip(unique, outcomes))
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            raise outcome
+    return [by_hash[digest] for digest in hashes]
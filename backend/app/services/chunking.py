@@ -0,0 +1,100 @@
+"""Split report text into extraction-sized chunks on page and section boundaries."""
+
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Character budget per extraction prompt chunk
+EXTRACTION_CHUNK_CHARS = int(os.getenv("EXTRACTION_CHUNK_CHARS", "6000"))
+
+PAGE_BREAK = "\f"
+
+_HAS_DIGIT = re.compile(r"\d")
+# A label or unit line next to its value line ("Haemoglobin" / "13.2" / "g/dL")
+_MAX_LABEL_CHARS = 60
+
+
+def condense_report(raw_text: str, max_chars: int = EXTRACTION_CHUNK_CHARS) -> str:
+    """
+    Drop lines that cannot hold a result: no digits and not a short label
+    or unit directly next to a numeric line. Numeric lines repeated across
+    pages (headers with dates, footers with phone numbers) are kept once.
+    Page breaks and blank lines survive as boundaries for `split_report`.
+
+    Text that already fits in one `max_chars` chunk is returned unchanged.
+    """
+    if len(raw_text) <= max_chars:
+        return raw_text.strip()
+    pages = []
+    seen: set[str] = set()
+    for page in raw_text.split(PAGE_BREAK):
+        lines = [" ".join(line.split()) for line in page.splitlines()]
+        kept = []
+        for i, line in enumerate(lines):
+            if not line:
+                kept.append("")
+                continue
+            numeric = bool(_HAS_DIGIT.search(line))
+            label = (
+                not numeric
+                and len(line) <= _MAX_LABEL_CHARS
+                and any(
+                    0 <= j < len(lines) and bool(_HAS_DIGIT.search(lines[j]))
+                    for j in (i - 1, i + 1)
+                )
+            )
+            if not (numeric or label):
+                continue
+            # Bare values and labels legitimately repeat; long numeric lines are page furniture or repeated rows
+            if numeric and len(line) > 20:
+                if line in seen:
+                    continue
+                seen.add(line)
+            kept.append(line)
+        pages.append(re.sub(r"\n{2,}", "\n\n", "\n".join(kept)).strip())
+    return PAGE_BREAK.join(page for page in pages if page)
+
+
+def split_report(text: str, max_chars: int = EXTRACTION_CHUNK_CHARS) -> list[str]:
+    """
+    Pack pages, then blank-line separated sections, into chunks of at most
+    `max_chars`; a section that is still too long is split between lines.
+    """
+    sections = []
+    for page in text.split(PAGE_BREAK):
+        for section in re.split(r"\n\s*\n", page):
+            section = section.strip()
+            if len(section) <= max_chars:
+                if section:
+                    sections.append(section)
+                continue
+            part = []
+            size = 0
+            for line in section.splitlines():
+                if part and size + len(line) + 1 > max_chars:
+                    sections.append("\n".join(part))
+                    part, size = [], 0
+                part.append(line[:max_chars])
+                size += len(part[-1]) + 1
+            if part:
+                sections.append("\n".join(part))
+
+    chunks = []
+    current: list[str] = []
+    size = 0
+    for section in sections:
+        if current and size + len(section) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(section)
+        size += len(section) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def extraction_chunks(raw_text: str, max_chars: int = EXTRACTION_CHUNK_CHARS) -> list[str]:
+    """Condensed report text split into the chunks sent for LLM extraction."""
+    return split_report(condense_report(raw_text, max_chars), max_chars)
@@ -0,0 +1,146 @@
+"""Unit conversion and vectorized LOW/HIGH/CRITICAL/NORMAL classification against reference ranges."""
+
+import re
+from collections.abc import Sequence
+from typing import NamedTuple
+
+import numpy as np
+
+from app.services.reference_data import REFERENCE_RANGES, UNIT_CONVERSIONS
+
+SEXES = ("default", "male", "female")
+UNKNOWN = "unknown"
+
+_SEX_RE = re.compile(
+    r"\b(?:sex|gender)(?:\s*/\s*age)?\s*[:\-]?\s*(male|female|m|f)\b", re.IGNORECASE
+)
+
+
+def _build_conversions() -> dict[tuple[str, str, str], tuple[float, float]]:
+    """(biomarker, from, to) -> (factor, offset), with the inverse of every listed conversion."""
+    registry = {}
+    for biomarker, from_units in UNIT_CONVERSIONS.items():
+        for from_unit, targets in from_units.items():
+            for to_unit, spec in targets.items():
+                factor, offset = (spec["factor"], spec.get("offset", 0.0)) if isinstance(spec, dict) else (spec, 0.0)
+                registry[(biomarker, from_unit, to_unit)] = (factor, offset)
+                registry.setdefault((biomarker, to_unit, from_unit), (1 / factor, -offset / factor))
+    return registry
+
+
+CONVERSIONS = _build_conversions()
+
+
+def conversion(key: str, from_unit: str, to_unit: str) -> tuple[float, float] | None:
+    """(factor, offset) taking a `key` value from `from_unit` to `to_unit`, or None if unknown."""
+    if from_unit == to_unit:
+        return 1.0, 0.0
+    return CONVERSIONS.get((key, from_unit, to_unit)) or CONVERSIONS.get(("*", from_unit, to_unit))
+
+
+def detect_sex(text: str) -> str | None:
+    """Patient sex from a `Sex: F` / `Gender: Male` style field, if the report has one."""
+    match = _SEX_RE.search(text)
+    if not match:
+        return None
+    return "male" if match.group(1).lower().startswith("m") else "female"
+
+
+def _build_range_table() -> tuple[dict[str, int], np.ndarray, np.ndarray]:
+    """Key index plus (K, sex, low/high) reference and (K, low/high) critical limits."""
+    keys = list(REFERENCE_RANGES)
+    ranges = np.full((len(keys), len(SEXES), 2), np.nan)
+    critical = np.full((len(keys), 2), np.nan)
+    for i, key in enumerate(keys):
+        ref = REFERENCE_RANGES[key]
+        default = ref["ranges"].get("default", next(iter(ref["ranges"].values())))
+        for j, sex in enumerate(SEXES):
+            limits = ref["ranges"].get(sex, default)
+            ranges[i, j] = (limits["low"], limits["high"])
+        limits = ref.get("critical", {})
+        critical[i] = (limits.get("low", np.nan), limits.get("high", np.nan))
+    return {key: i for i, key in enumerate(keys)}, ranges, critical
+
+
+_KEY_INDEX, _RANGES, _CRITICAL = _build_range_table()
+
+
+def _optional_array(values: Sequence[float | None] | None, n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, np.nan)
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
+
+
+class Classification(NamedTuple):
+    """Per-row results of `classify`; reference_low/high are NaN for unknown rows."""
+    value: np.ndarray
+    unit: list[str]
+    reference_low: np.ndarray
+    reference_high: np.ndarray
+    status: np.ndarray
+
+
+def classify(
+    keys: Sequence[str | None],
+    values: Sequence[float],
+    units: Sequence[str],
+    sex: str | Sequence[str | None] | None = None,
+    lab_low: Sequence[float | None] | None = None,
+    lab_high: Sequence[float | None] | None = None,
+) -> Classification:
+    """
+    Classify a panel, or many reports' panels concatenated, in one pass.
+
+    Values are converted to each biomarker's reference unit and compared
+    with its sex-specific range (default when `sex` is unknown); `sex` may
+    be one value for all rows or one per row. Rows with a lab-printed range
+    (`lab_low`/`lab_high`) are compared with it in the lab's own units.
+    Rows with no reference entry, or whose unit is missing or cannot be
+    converted, are "unknown".
+    """
+    n = len(keys)
+    values = np.asarray(values, dtype=float)
+    sexes = [sex] * n if sex is None or isinstance(sex, str) else list(sex)
+    lab_low = _optional_array(lab_low, n)
+    lab_high = _optional_array(lab_high, n)
+
+    # Gather per-row table indices and conversion factors (dict lookups only)
+    key_idx = np.zeros(n, dtype=np.intp)
+    sex_idx = np.zeros(n, dtype=np.intp)
+    factor = np.full(n, np.nan)
+    offset = np.zeros(n)
+    ref_units = list(units)
+    for i, (key, unit, row_sex) in enumerate(zip(keys, units, sexes)):
+        if key is None:
+            continue
+        key_idx[i] = _KEY_INDEX[key]
+        sex_idx[i] = SEXES.index(row_sex) if row_sex in SEXES else 0
+        ref_unit = REFERENCE_RANGES[key]["unit"]
+        # A missing unit is not assumed to be the reference unit: a value without one cannot be compared
+        converted = conversion(key, unit, ref_unit) if unit else None
+        if converted is not None:
+            factor[i], offset[i] = converted
+            ref_units[i] = ref_unit
+
+    has_lab = ~np.isnan(lab_low) & ~np.isnan(lab_high)
+    has_ref = ~np.isnan(factor) & ~has_lab
+    out_units = [unit if lab else ref_unit for unit, ref_unit, lab in zip(units, ref_units, has_lab)]
+
+    converted = np.where(has_ref, values * np.nan_to_num(factor) + offset, values)
+    limits = _RANGES[key_idx, sex_idx]
+    low = np.where(has_lab, lab_low, np.where(has_ref, limits[:, 0], np.nan))
+    high = np.where(has_lab, lab_high, np.where(has_ref, limits[:, 1], np.nan))
+    crit = np.where(has_ref[:, None], _CRITICAL[key_idx], np.nan)
+
+    with np.errstate(invalid="ignore"):
+        status = np.select(
+            [
+                ~(has_lab | has_ref),
+                (converted < crit[:, 0]) | (converted > crit[:, 1]),
+                converted < low,
+                converted > high,
+            ],
+            [UNKNOWN, "critical", "low", "high"],
+            default="normal",
+        )
+    return Classification(converted, out_units, low, high, status)
@@ -0,0 +1,67 @@
+"""Local library of biomarker explanations keyed by (reference key, status), per provider chain and analysis prompt."""
+
+import json
+import logging
+import os
+from dotenv import load_dotenv
+
+from app.services.cache import TieredCache
+from app.services.llm_service import memo_version
+from app.services.reference_data import REFERENCE_RANGES
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EXPLANATION_LIBRARY_ENABLED = os.getenv("EXPLANATION_LIBRARY_ENABLED", "true").lower() == "true"
+# Explanations learned from LLM analyses, shared across reports and workers
+EXPLANATION_LIBRARY = TieredCache(
+    "explanation_library",
+    max_entries=int(os.getenv("EXPLANATION_LIBRARY_MAX_ENTRIES", "2048")),
+    ttl=float(os.getenv("EXPLANATION_LIBRARY_TTL", str(90 * 24 * 3600))),
+    max_bytes=int(os.getenv("EXPLANATION_LIBRARY_MAX_BYTES", str(16 * 1024 * 1024))),
+)
+
+
+def _library_key(version: str, key: str, status: str) -> str:
+    return f"{version}:{key}:{status}"
+
+
+def lookup_explanations(entries: list[tuple[str | None, str]]) -> list[dict | None]:
+    """
+    Local explanation for each (reference key, status), or None.
+
+    Learned explanations win; normal results otherwise fall back to the
+    reference description. Unknown biomarkers are never answered locally.
+    """
+    version = memo_version(EXPLANATION_LIBRARY, "analysis_prompt")
+    found = []
+    for key, status in entries:
+        explanation = None
+        if EXPLANATION_LIBRARY_ENABLED and key is not None and status != "unknown":
+            cached = EXPLANATION_LIBRARY.get(_library_key(version, key, status))
+            if cached is not None:
+                explanation = json.loads(cached)
+            elif status == "normal":
+                explanation = {
+                    "explanation": f"{REFERENCE_RANGES[key]['description'].rstrip('.')}. Your result is within the normal range.",
+                    "recommendation": None,
+                }
+        found.append(explanation)
+    return found
+
+
+def learn_explanations(entries: list[tuple[str | None, str, dict]]) -> None:
+    """Store LLM explanations for later reports with the same biomarker and status."""
+    if not EXPLANATION_LIBRARY_ENABLED:
+        return
+    version = memo_version(EXPLANATION_LIBRARY, "analysis_prompt")
+    learned = 0
+    for key, status, explanation in entries:
+        if key is None or status == "unknown" or not explanation.get("explanation"):
+            continue
+        payload = {"explanation": explanation["explanation"], "recommendation": explanation.get("recommendation")}
+        EXPLANATION_LIBRARY.set(_library_key(version, key, status), json.dumps(payload))
+        learned += 1
+    if learned:
+        logger.info(f"Explanation library learned {learned} entries")
@@ -0,0 +1,115 @@
+"""Provider health, refreshed in the background and served from memory."""
+
+import asyncio
+import logging
+import os
+import time
+from dotenv import load_dotenv
+
+from app.services.providers import OCR_ROUTER, TEXT_ROUTER, Provider
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reachability probes of each provider
+HEALTH_REFRESH_INTERVAL = float(os.getenv("HEALTH_REFRESH_INTERVAL", "30.0"))
+# Real traffic newer than this stands in for a probe
+HEALTH_TRAFFIC_WINDOW = float(os.getenv("HEALTH_TRAFFIC_WINDOW", "120.0"))
+
+
+class HealthMonitor:
+    """
+    Probes every configured provider on an interval and keeps the result.
+
+    Probes are model lookups, not completions, and are skipped for a
+    provider that served real traffic within HEALTH_TRAFFIC_WINDOW.
+    Readers (`snapshot`, `is_ready`) only touch memory.
+    """
+
+    def __init__(self, providers: list[Provider], interval: float):
+        self.providers = providers
+        self.interval = interval
+        self._reachable: dict[Provider, bool] = {}
+        self._checked_at: dict[Provider, float] = {}
+        self._probe_latency: dict[Provider, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def refresh(self) -> None:
+        await asyncio.gather(*(self._check(provider) for provider in self.providers))
+
+    async def _check(self, provider: Provider) -> None:
+        now = time.time()
+        last_success = provider.latency.last_success
+        if last_success is not None and now - last_success < HEALTH_TRAFFIC_WINDOW:
+            self._reachable[provider] = True
+            self._checked_at[provider] = last_success
+            return
+
+        start = time.monotonic()
+        try:
+            reachable = await provider.probe()
+        except Exception as e:
+            logger.warning(f"{provider.label} health probe failed: {e}")
+            reachable = False
+        if reachable != self._reachable.get(provider):
+            logger.info(f"{provider.label} is {'reachable' if reachable else 'unreachable'}")
+        self._reachable[provider] = reachable
+        self._checked_at[provider] = now
+        self._probe_latency[provider] = time.monotonic() - start
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Health refresh failed")
+            await asyncio.sleep(self.interval)
+
+    def provider_status(self, provider: Provider) -> dict:
+        success_rate = provider.latency.success_rate()
+        p95 = provider.latency.p95(min_samples=1)
+        probe_latency = self._probe_latency.get(provider)
+        return {
+            "name": provider.name,
+            "model": provider.model,
+            "reachable": self._reachable.get(provider),
+            "circuit": provider.breaker.state,
+            "checked_at": self._checked_at.get(provider),
+            "probe_latency_ms": round(probe_latency * 1000, 1) if probe_latency is not None else None,
+            "success_rate": round(success_rate, 3) if success_rate is not None else None,
+            "p95_latency_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "samples": provider.latency.samples,
+        }
+
+    def available(self, provider: Provider) -> bool:
+        return bool(self._reachable.get(provider)) and provider.breaker.state != "open"
+
+    def llm_connected(self) -> bool:
+        return any(self.available(p) for p in TEXT_ROUTER.providers)
+
+    def is_ready(self) -> bool:
+        """At least one text provider is reachable with its circuit not open."""
+        return self.llm_connected()
+
+    def snapshot(self) -> dict:
+        return {
+            "text": [self.provider_status(p) for p in TEXT_ROUTER.providers],
+            "ocr": [self.provider_status(p) for p in OCR_ROUTER.providers],
+        }
+
+
+def _unique_providers() -> list[Provider]:
+    return list(dict.fromkeys(TEXT_ROUTER.providers + OCR_ROUTER.providers))
+
+
+HEALTH_MONITOR = HealthMonitor(_unique_providers(), HEALTH_REFRESH_INTERVAL)
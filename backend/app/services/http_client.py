@@ -0,0 +1,81 @@
+"""Shared, pooled HTTP client for outbound LLM and OCR calls."""
+
+import logging
+import os
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60.0"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+
+# Per-endpoint timeouts (seconds)
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60.0"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "120.0"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "10.0"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10.0"))
+
+_client: httpx.AsyncClient | None = None
+
+
+def endpoint_timeout(seconds: float) -> httpx.Timeout:
+    """Build a request timeout with a shared connect timeout."""
+    return httpx.Timeout(seconds, connect=min(HTTP_CONNECT_TIMEOUT, seconds))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2 and not _http2_available():
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    logger.info(
+        f"Creating shared HTTP client (max_connections={HTTP_MAX_CONNECTIONS}, "
+        f"keepalive={HTTP_MAX_KEEPALIVE_CONNECTIONS}, http2={http2})"
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2, timeout=endpoint_timeout(GROQ_TIMEOUT))
+
+
+def set_http_client(client: httpx.AsyncClient | None) -> None:
+    """Inject the application-scoped client into the service layer."""
+    global _client
+    _client = client
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Return the shared client.
+
+    The FastAPI lifespan hook installs the client; scripts that call the
+    services directly get one created lazily on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,285 @@
+"""Asynchronous analysis jobs backed by a local SQLite store and background workers."""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from dotenv import load_dotenv
+
+from app.services.analyzer import iter_analysis_events
+from app.services.cache import CACHE_DIR
+from app.services.metrics import RETRIES
+from app.services.rate_limiter import backoff_delay
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB = Path(os.getenv("JOBS_DB", str(CACHE_DIR / "jobs.sqlite3")))
+# Background workers in the API process; 0 leaves the work to run_worker.py processes
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+# A running job not updated for this long is assumed orphaned by a dead worker
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobStore:
+    """Durable job table shared by the API and any number of worker processes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    pdf BLOB,
+                    result TEXT,
+                    error TEXT,
+                    status_code INTEGER,
+                    available_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    finished_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, available_at)")
+            self._conn = conn
+        return self._conn
+
+    def submit(self, filename: str, pdf_bytes: bytes) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, filename, status, pdf, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, QUEUED, pdf_bytes, now, now, now),
+            )
+        return job_id
+
+    def claim(self) -> tuple[str, bytes, int] | None:
+        """Atomically move the oldest runnable job to running; returns (id, pdf, attempt)."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, pdf, attempts FROM jobs WHERE status = ? AND available_at <= ? "
+                    "ORDER BY available_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (RUNNING, now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return (row["id"], row["pdf"], row["attempts"] + 1) if row is not None else None
+
+    def update_progress(self, job_id: str, stage: str, progress: dict) -> None:
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?",
+                (stage, json.dumps(progress), time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result_json: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._connect().execute(
+                "UPDATE jobs SET status = ?, stage = 'done', result = ?, error = NULL, status_code = NULL, "
+                "pdf = NULL, updated_at = ?, finished_at = ? WHERE id = ?",
+                (SUCCEEDED, result_json, now, now, job_id),
+            )
+
+    def fail(self, job_id: str, error: str, status_code: int, retry_in: float | None) -> None:
+        """Requeue the job after `retry_in` seconds, or mark it failed when None."""
+        now = time.time()
+        with self._lock:
+            if retry_in is not None:
+                self._connect().execute(
+                    "UPDATE jobs SET status = ?, error = ?, status_code = ?, available_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (QUEUED, error, status_code, now + retry_in, now, job_id),
+                )
+            else:
+                self._connect().execute(
+                    "UPDATE jobs SET status = ?, error = ?, status_code = ?, pdf = NULL, updated_at = ?, "
+                    "finished_at = ? WHERE id = ?",
+                    (FAILED, error, status_code, now, now, job_id),
+                )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT id, filename, status, stage, progress, attempts, result, error, status_code, "
+                "created_at, updated_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        return job
+
+    def housekeeping(self) -> None:
+        """
+        Drop finished jobs past retention and requeue jobs orphaned by dead
+        workers; an orphaned job that has used all its attempts is failed
+        instead, so a PDF that crashes its worker is not retried forever.
+        """
+        now = time.time()
+        stale = now - JOB_STALE_SECONDS
+        with self._lock:
+            conn = self._connect()
+            purged = conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (now - JOB_RETENTION_SECONDS,),
+            ).rowcount
+            failed = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, status_code = ?, pdf = NULL, updated_at = ?, finished_at = ? "
+                "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+                (
+                    FAILED, f"Worker stopped responding on all {JOB_MAX_ATTEMPTS} attempts", 500, now, now,
+                    RUNNING, stale, JOB_MAX_ATTEMPTS,
+                ),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, now, now, RUNNING, stale),
+            ).rowcount
+        if purged or requeued or failed:
+            logger.info(f"Job housekeeping: purged {purged}, requeued {requeued} stale, failed {failed} out of attempts")
+
+
+JOB_STORE = JobStore(JOBS_DB)
+
+
+def _error_status(e: Exception) -> tuple[int, bool]:
+    """HTTP status for a pipeline error and whether retrying can help."""
+    if isinstance(e, ValueError):
+        return 400, False
+    if isinstance(e, (ConnectionError, RuntimeError)):
+        return 503, True
+    return 500, True
+
+
+async def run_job(job_id: str, pdf_bytes: bytes, attempt: int) -> None:
+    """
+    Run one claimed job, recording per-stage progress.
+
+    Finished stages are memoized (OCR pages, LLM extraction and analysis),
+    so a retry only redoes the stage that failed. A result produced with
+    an LLM fallback counts as a failed stage while attempts remain.
+    """
+    degraded = []
+    try:
+        async for event, data in iter_analysis_events(pdf_bytes):
+            if event == "result":
+                if degraded and attempt < JOB_MAX_ATTEMPTS:
+                    raise RuntimeError(f"Stage {degraded[0]['stage']} failed: {degraded[0]['error']}")
+                await asyncio.to_thread(JOB_STORE.complete, job_id, data.model_dump_json())
+                logger.info(f"Job {job_id} succeeded (attempt {attempt})")
+                return
+            if event == "stage_failed":
+                degraded.append(data)
+            progress = {"event": event}
+            if event in ("ocr_progress", "text_extracted"):
+                progress.update(data)
+            elif event == "biomarkers":
+                progress["biomarkers"] = len(data["biomarkers"])
+            await asyncio.to_thread(JOB_STORE.update_progress, job_id, event, progress)
+    except Exception as e:
+        status_code, retryable = _error_status(e)
+        retry_in = None
+        if retryable and attempt < JOB_MAX_ATTEMPTS:
+            retry_in = backoff_delay(attempt, 5.0, 120.0)
+            RETRIES.labels(operation="job", reason="error" if status_code == 500 else "upstream").inc()
+        if status_code == 500:
+            logger.exception(f"Job {job_id} failed unexpectedly (attempt {attempt})")
+        else:
+            logger.warning(f"Job {job_id} failed (attempt {attempt}): {e}")
+        detail = str(e) if status_code != 500 else "An unexpected error occurred during analysis"
+        await asyncio.to_thread(JOB_STORE.fail, job_id, detail, status_code, retry_in)
+
+
+class JobWorkerPool:
+    """Background asyncio workers that claim and run queued jobs."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        if self.workers <= 0:
+            return
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+        logger.info(f"Started {self.workers} job workers")
+
+    def notify(self) -> None:
+        """Wake idle workers after a local submit instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                claimed = await asyncio.to_thread(JOB_STORE.claim)
+            except sqlite3.Error as e:
+                logger.error(f"Job worker {index} could not claim a job: {e}")
+                claimed = None
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await run_job(*claimed)
+
+    async def _housekeeping(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(JOB_STORE.housekeeping)
+            except sqlite3.Error as e:
+                logger.error(f"Job housekeeping failed: {e}")
+            await asyncio.sleep(60)
@@ -0,0 +1,78 @@
+"""Incremental parsing of JSON objects out of a streamed LLM completion."""
+
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingArrayParser:
+    """
+    Yields each object of a top-level JSON array as soon as it closes.
+
+    Feed completion deltas with `feed`; it returns the objects completed by
+    that chunk. Text before the array (markdown fences, preamble) is ignored.
+    """
+
+    def __init__(self, key: str):
+        self._start_re = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = -1
+
+    def feed(self, chunk: str) -> list[dict]:
+        if self._done:
+            return []
+        self._buffer += chunk
+
+        if not self._in_array:
+            match = self._start_re.search(self._buffer)
+            if not match:
+                return []
+            self._in_array = True
+            self._buffer = self._buffer[match.end():]
+            self._pos = 0
+
+        objects = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buf[self._obj_start:i + 1]))
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Skipping malformed streamed object: {e}")
+                    self._obj_start = -1
+            elif ch == "]" and self._depth == 0:
+                self._done = True
+                break
+            i += 1
+
+        # Drop everything before the object currently being read
+        keep_from = self._obj_start if self._obj_start >= 0 else i
+        self._buffer = buf[keep_from:]
+        self._obj_start = 0 if self._obj_start >= 0 else -1
+        self._pos = i - keep_from
+        return objects
@@ -1,70 +1,158 @@
-"""LLM service for Groq API integration."""
+"""LLM service: extraction, analysis and OCR prompts sent through the configured providers."""
 
-import base64
-import httpx
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import time
+from collections.abc import AsyncIterator, Collection
 from pathlib import Path
 from dotenv import load_dotenv
 
 from app.models import ExtractedBiomarker
+from app.services.cache import TieredCache
+from app.services.chunking import condense_report, extraction_chunks
+from app.services.json_stream import StreamingArrayParser
+from app.services.metrics import RETRIES
+from app.services.rate_limiter import backoff_delay
+from app.services.providers import (
+    OCR_ROUTER,
+    TEXT_ROUTER,
+    Provider,
+    ProviderError,
+    RateLimitedError,
+)
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-# Configurable Groq settings
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60.0"))
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# OCR quota accounting (the Gemini bucket is shared by every request in this process)
+OCR_TOKENS_PER_PAGE = int(os.getenv("OCR_TOKENS_PER_PAGE", "1500"))  # estimate: image + prompt + output
+OCR_MAX_ATTEMPTS = int(os.getenv("OCR_MAX_ATTEMPTS", "5"))
+OCR_BACKOFF_BASE = float(os.getenv("OCR_BACKOFF_BASE", "2.0"))
+OCR_BACKOFF_MAX = float(os.getenv("OCR_BACKOFF_MAX", "60.0"))
+OCR_INSTRUCTION = (
+    "Extract ALL text from this blood test report image exactly as it appears. Include all biomarker names, "
+    "values, units, and reference ranges. Return only the extracted text, nothing else."
+)
+
+# Chunks of one long report extracted at once
+EXTRACTION_CHUNK_CONCURRENCY = int(os.getenv("EXTRACTION_CHUNK_CONCURRENCY", "4"))
 
 PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
 
+# Stage-level memoization of LLM extraction/analysis outputs
+LLM_MEMO_ENABLED = os.getenv("LLM_MEMO_ENABLED", "true").lower() == "true"
+_memo_settings = dict(
+    max_entries=int(os.getenv("LLM_MEMO_MAX_ENTRIES", "1024")),
+    ttl=float(os.getenv("LLM_MEMO_TTL", str(30 * 24 * 3600))),
+    max_bytes=int(os.getenv("LLM_MEMO_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+EXTRACTION_MEMO = TieredCache("llm_extraction", **_memo_settings)
+OCR_MEMO = TieredCache("ocr_page", **_memo_settings)
+ANALYSIS_MEMO = TieredCache("llm_analysis", **_memo_settings)
+_memo_versions: dict[str, str] = {}
+# Prompt names -> (file mtimes, fingerprint)
+_prompt_versions: dict[tuple[str, ...], tuple[tuple[int, ...], str]] = {}
+
 
 def load_prompt(name: str) -> str:
     return (PROMPTS_DIR / f"{name}.txt").read_text()
 
 
-async def query_llm(prompt: str, json_output: bool = False) -> str:
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": [{"role": "user", "content": prompt}],
-    }
-    if json_output:
-        payload["response_format"] = {"type": "json_object"}
-
-    async with httpx.AsyncClient(timeout=GROQ_TIMEOUT) as client:
-        try:
-            response = await client.post(GROQ_API_URL, json=payload, headers=headers)
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except httpx.ConnectError:
-            raise ConnectionError(
-                "Cannot connect to Groq API. Check your internet connection."
-            )
-        except httpx.TimeoutException:
-            raise RuntimeError(
-                f"Groq API request timed out after {GROQ_TIMEOUT}s."
-            )
-        except httpx.HTTPStatusError as e:
-            raise RuntimeError(f"Groq API request failed: {e.response.text}")
+def prompt_version(*names: str) -> str:
+    """
+    Short fingerprint of the given prompt templates (all of them by default).
+    Cached until a template's mtime changes, so requests only stat the files.
+    """
+    names = names or tuple(sorted(p.stem for p in PROMPTS_DIR.glob("*.txt")))
+    mtimes = tuple((PROMPTS_DIR / f"{name}.txt").stat().st_mtime_ns for name in names)
+    cached = _prompt_versions.get(names)
+    if cached is not None and cached[0] == mtimes:
+        return cached[1]
 
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(name.encode("utf-8"))
+        digest.update(load_prompt(name).encode("utf-8"))
+    version = digest.hexdigest()[:12]
+    _prompt_versions[names] = (mtimes, version)
+    return version
 
-async def extract_biomarkers_llm(raw_text: str) -> list[ExtractedBiomarker]:
+
+def memo_version(memo: TieredCache, prompt_name: str) -> str:
     """
-    Use LLM to extract biomarkers from raw PDF text.
-    Fallback when regex extraction is incomplete.
+    Current provider chain/prompt version for a memo; clears it when either
+    changed. Any configured provider may have answered, so every model counts.
     """
+    version = f"{TEXT_ROUTER.fingerprint()}:{prompt_version(prompt_name)}"
+    previous = _memo_versions.get(memo.namespace)
+    if previous is not None and previous != version:
+        logger.info(f"'{prompt_name}' or the provider chain changed, invalidating {memo.namespace} memo")
+        memo.clear()
+    _memo_versions[memo.namespace] = version
+    return version
+
+
+def _memo_key(version: str, payload: str) -> str:
+    return f"{version}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def normalize_raw_text(raw_text: str) -> str:
+    """Collapse whitespace so layout-only differences share a memo entry."""
+    lines = (" ".join(line.split()) for line in raw_text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def canonicalize_biomarkers(biomarkers_for_analysis: list[dict]) -> str:
+    """Order- and precision-insensitive JSON form of an analysis payload."""
+    canonical = []
+    for b in biomarkers_for_analysis:
+        entry = {k: round(v, 2) if isinstance(v, float) else v for k, v in b.items()}
+        entry["name"] = str(entry.get("name", "")).strip().lower()
+        canonical.append(entry)
+    canonical.sort(key=lambda e: (e["name"], str(e.get("value"))))
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+
+async def query_llm(prompt: str, json_output: bool = False) -> str:
+    """Completion from the configured text providers (hedged, with failover)."""
+    return await TEXT_ROUTER.complete(prompt, json_output)
+
+
+async def query_llm_stream(prompt: str) -> AsyncIterator[str]:
+    """Stream completion text deltas from the first healthy text provider."""
+    async for delta in TEXT_ROUTER.stream(prompt):
+        yield delta
+
+
+def _parse_biomarker_item(item: dict) -> ExtractedBiomarker:
+    return ExtractedBiomarker(
+        name=item["name"].lower(),
+        value=float(item["value"]),
+        unit=item["unit"]
+    )
+
+
+async def _extraction_memo_key(raw_text: str) -> str:
+    version = await asyncio.to_thread(memo_version, EXTRACTION_MEMO, "extraction_prompt")
+    return _memo_key(version, normalize_raw_text(raw_text))
+
+
+async def _extract_chunk(raw_text: str) -> list[ExtractedBiomarker]:
+    memo_key = None
+    if LLM_MEMO_ENABLED:
+        memo_key = await _extraction_memo_key(raw_text)
+        cached = await asyncio.to_thread(EXTRACTION_MEMO.get, memo_key)
+        if cached is not None:
+            logger.info("Extraction memo hit")
+            return [ExtractedBiomarker(**item) for item in json.loads(cached)]
+
     prompt_template = load_prompt("extraction_prompt")
-    prompt = prompt_template.format(raw_text=raw_text[:8000])  # Limit context size
+    prompt = prompt_template.format(raw_text=raw_text)
 
     response = await query_llm(prompt, json_output=True)
 
@@ -73,105 +161,289 @@ async def extract_biomarkers_llm(raw_text: str) -> list[ExtractedBiomarker]:
         logger.info(f"LLM response:\n{data}")
         biomarkers = []
         for item in data.get("biomarkers", []):
-            biomarkers.append(ExtractedBiomarker(
-                name=item["name"].lower(),
-                value=float(item["value"]),
-                unit=item["unit"]
-            ))
+            biomarkers.append(_parse_biomarker_item(item))
+        if memo_key and biomarkers:
+            payload = json.dumps([b.model_dump() for b in biomarkers])
+            await asyncio.to_thread(EXTRACTION_MEMO.set, memo_key, payload)
         return biomarkers
     except (json.JSONDecodeError, KeyError, ValueError) as e:
         logger.error(f"Failed to parse LLM extraction response: {e}")
         return []
 
 
-async def analyze_biomarkers(biomarkers_for_analysis: list[dict]) -> dict:
+async def extract_biomarkers_llm(raw_text: str) -> list[ExtractedBiomarker]:
+    """
+    Use LLM to extract biomarkers from raw PDF text.
+    Fallback when regex extraction is incomplete.
+
+    The report is condensed and split on page/section boundaries; chunks
+    are extracted concurrently (each memoized on its own, so a retry only
+    repeats the chunks that failed) and merged, first occurrence winning.
+    """
+    chunks = extraction_chunks(raw_text)
+    if len(chunks) > 1:
+        logger.info(f"Extracting {len(chunks)} chunks of a {len(raw_text)}-character report")
+    semaphore = asyncio.Semaphore(EXTRACTION_CHUNK_CONCURRENCY)
+
+    async def run(chunk: str) -> list[ExtractedBiomarker]:
+        async with semaphore:
+            return await _extract_chunk(chunk)
+
+    results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+    seen = set()
+    merged = []
+    for biomarker in (b for chunk_result in results for b in chunk_result):
+        if biomarker.name not in seen:
+            seen.add(biomarker.name)
+            merged.append(biomarker)
+    return merged
+
+
+async def extract_biomarkers_llm_batch(raw_texts: list[str]) -> list[list[ExtractedBiomarker]]:
+    """
+    Extract biomarkers from several reports with a single LLM call.
+
+    Reports already in the extraction memo are answered from it; the rest
+    are packed into one prompt and their results memoized individually.
+    Raises ValueError if the packed response cannot be attributed to
+    its reports, so callers can fall back to per-report extraction.
+    """
+    raw_texts = [condense_report(text) for text in raw_texts]
+    results: list[list[ExtractedBiomarker] | None] = [None] * len(raw_texts)
+    memo_keys: list[str | None] = [None] * len(raw_texts)
+
+    if LLM_MEMO_ENABLED:
+        for i, text in enumerate(raw_texts):
+            memo_keys[i] = await _extraction_memo_key(text)
+            cached = await asyncio.to_thread(EXTRACTION_MEMO.get, memo_keys[i])
+            if cached is not None:
+                results[i] = [ExtractedBiomarker(**item) for item in json.loads(cached)]
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    if pending:
+        reports_text = "\n\n".join(f"## Report r{i}\n{raw_texts[i]}" for i in pending)
+        prompt = load_prompt("batch_extraction_prompt").format(reports_text=reports_text)
+        response = await query_llm(prompt, json_output=True)
+
+        try:
+            reports = {str(r["id"]): r.get("biomarkers", []) for r in json.loads(response).get("reports", [])}
+        except (json.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Failed to parse batch extraction response: {e}")
+
+        for i in pending:
+            if f"r{i}" not in reports:
+                raise ValueError(f"Batch extraction response is missing report r{i}")
+            biomarkers = []
+            for item in reports[f"r{i}"]:
+                try:
+                    biomarkers.append(_parse_biomarker_item(item))
+                except (KeyError, ValueError, TypeError, AttributeError):
+                    continue
+            results[i] = biomarkers
+            if memo_keys[i] and biomarkers:
+                payload = json.dumps([b.model_dump() for b in biomarkers])
+                await asyncio.to_thread(EXTRACTION_MEMO.set, memo_keys[i], payload)
+        logger.info(f"Batch extraction packed {len(pending)} reports into one LLM call")
+
+    return results
+
+
+async def _stream_chunk(raw_text: str) -> AsyncIterator[ExtractedBiomarker]:
+    memo_key = None
+    if LLM_MEMO_ENABLED:
+        memo_key = await _extraction_memo_key(raw_text)
+        cached = await asyncio.to_thread(EXTRACTION_MEMO.get, memo_key)
+        if cached is not None:
+            logger.info("Extraction memo hit")
+            for item in json.loads(cached):
+                yield ExtractedBiomarker(**item)
+            return
+
+    prompt = load_prompt("extraction_prompt").format(raw_text=raw_text)
+    parser = StreamingArrayParser("biomarkers")
+    biomarkers = []
+    async for delta in query_llm_stream(prompt):
+        for item in parser.feed(delta):
+            try:
+                biomarker = _parse_biomarker_item(item)
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                logger.warning(f"Skipping unparseable streamed biomarker {item}: {e}")
+                continue
+            biomarkers.append(biomarker)
+            yield biomarker
+
+    logger.info(f"LLM streamed {len(biomarkers)} biomarkers")
+    if memo_key and biomarkers:
+        payload = json.dumps([b.model_dump() for b in biomarkers])
+        await asyncio.to_thread(EXTRACTION_MEMO.set, memo_key, payload)
+
+
+async def extract_biomarkers_llm_stream(raw_text: str) -> AsyncIterator[ExtractedBiomarker]:
+    """
+    Streaming variant of extract_biomarkers_llm.
+
+    Yields each biomarker as soon as its JSON object closes in the
+    completion, so callers can resolve reference ranges while the model is
+    still generating. Chunks of a long report stream concurrently.
+    """
+    chunks = extraction_chunks(raw_text)
+    if len(chunks) > 1:
+        logger.info(f"Streaming extraction of {len(chunks)} chunks of a {len(raw_text)}-character report")
+    semaphore = asyncio.Semaphore(EXTRACTION_CHUNK_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def stream_chunk(chunk: str) -> None:
+        try:
+            async with semaphore:
+                async for biomarker in _stream_chunk(chunk):
+                    await results.put(biomarker)
+            await results.put(None)
+        except Exception as e:
+            await results.put(e)
+
+    tasks = [asyncio.create_task(stream_chunk(chunk)) for chunk in chunks]
+    seen = set()
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await results.get()
+            if item is None:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            elif item.name not in seen:
+                seen.add(item.name)
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _format_biomarker_line(b: dict) -> str:
+    """Compact one-line form: `ferritin: 8 ng/mL (20-500) LOW`."""
+    line = f"- {b['name']}: {b['value']:g} {b['unit']}".rstrip()
+    if b.get("reference_low") is not None and b.get("reference_high") is not None:
+        line += f" ({b['reference_low']:g}-{b['reference_high']:g})"
+    return f"{line} {str(b['status']).upper()}"
+
+
+async def analyze_biomarkers(biomarkers_for_analysis: list[dict], explained: Collection[str] = ()) -> dict:
     """
     Generate health analysis from biomarkers using LLM.
 
     Args:
         biomarkers_for_analysis: List of dicts with name, value, unit, status, reference range
+        explained: Names that already have a local explanation; they are sent
+            as context only (normal ones by name alone) and not explained again
 
     Returns:
         Dict with summary, biomarker_explanations, concerns, recommendations
+        and the name of the provider that answered
     """
+    to_explain = [b for b in biomarkers_for_analysis if b["name"] not in explained]
+    context = [b for b in biomarkers_for_analysis if b["name"] in explained and b["status"] != "normal"]
+    normal = [b["name"] for b in biomarkers_for_analysis if b["name"] in explained and b["status"] == "normal"]
+
+    memo_key = None
+    if LLM_MEMO_ENABLED:
+        version = await asyncio.to_thread(memo_version, ANALYSIS_MEMO, "analysis_prompt")
+        payload = canonicalize_biomarkers(to_explain) + canonicalize_biomarkers(context) + json.dumps(sorted(normal))
+        memo_key = _memo_key(version, payload)
+        cached = await asyncio.to_thread(ANALYSIS_MEMO.get, memo_key)
+        if cached is not None:
+            logger.info("Analysis memo hit")
+            return json.loads(cached)
+
     prompt_template = load_prompt("analysis_prompt")
-    biomarkers_json = json.dumps(biomarkers_for_analysis, indent=2)
-    prompt = prompt_template.format(biomarkers_json=biomarkers_json)
+    prompt = prompt_template.format(
+        biomarkers_text="\n".join(_format_biomarker_line(b) for b in to_explain) or "None",
+        explained_text="\n".join(_format_biomarker_line(b) for b in context) or "None",
+        normal_text=", ".join(normal) or "None",
+    )
+    logger.info(f"Analysis prompt explains {len(to_explain)} of {len(biomarkers_for_analysis)} biomarkers")
 
-    response = await query_llm(prompt, json_output=True)
+    response, provider = await TEXT_ROUTER.complete_with_provider(prompt, json_output=True)
 
     try:
-        return json.loads(response)
+        analysis = json.loads(response)
+        analysis["provider"] = provider.name
+        if memo_key and analysis.get("summary"):
+            await asyncio.to_thread(ANALYSIS_MEMO.set, memo_key, json.dumps(analysis))
+        return analysis
     except json.JSONDecodeError as e:
-        logger.error(f"Failed to parse LLM analysis response: {e}")
-        # Return a fallback response
-        return {
-            "summary": "Analysis could not be completed. Please review your results with a healthcare provider.",
-            "biomarker_explanations": [],
-            "concerns": [],
-            "recommendations": ["Consult with your healthcare provider to discuss these results."]
-        }
-
-
-async def ocr_page_image(image_bytes: bytes) -> str:
-    """Use Gemini vision to OCR a single page image, with retry for rate limits."""
-    import asyncio
-    b64 = base64.b64encode(image_bytes).decode("utf-8")
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": "Extract ALL text from this blood test report image exactly as it appears. Include all biomarker names, values, units, and reference ranges. Return only the extracted text, nothing else."},
-                    {
-                        "inline_data": {
-                            "mime_type": "image/jpeg",
-                            "data": b64,
-                        }
-                    },
-                ]
-            }
-        ]
-    }
-
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        for attempt in range(5):
-            try:
-                response = await client.post(url, json=payload)
-                if response.status_code == 429:
-                    wait = 15 * (attempt + 1)  # 15s, 30s, 45s, 60s, 75s
-                    logger.warning(f"Gemini rate limited, retrying in {wait}s (attempt {attempt + 1}/5)...")
-                    await asyncio.sleep(wait)
-                    continue
-                response.raise_for_status()
-                return response.json()["candidates"][0]["content"]["parts"][0]["text"]
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Gemini Vision OCR failed (attempt {attempt + 1}): {e}")
-                if attempt < 4:
-                    await asyncio.sleep(15)
-            except Exception as e:
-                logger.error(f"Gemini Vision OCR error (attempt {attempt + 1}): {e}")
-                if attempt < 4:
-                    await asyncio.sleep(10)
-        return ""
-
-
-async def check_llm_connection() -> bool:
-    """Check if the Groq API is reachable and the API key is set."""
-    if not GROQ_API_KEY:
-        return False
-    try:
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json",
-        }
-        payload = {
-            "model": GROQ_MODEL,
-            "messages": [{"role": "user", "content": "hi"}],
-            "max_tokens": 1,
-        }
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(GROQ_API_URL, json=payload, headers=headers)
-            return response.status_code == 200
-    except Exception:
-        return False
+        # Raised so the pipeline falls back to a degraded (uncached) result, like a timeout
+        raise RuntimeError(f"Failed to parse LLM analysis response: {e}")
+
+
+def _ocr_memo_key(provider: Provider, image_digest: str) -> str:
+    return f"{provider.name}:{provider.model}:{image_digest}"
+
+
+async def ocr_page_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
+    """OCR a single page image with a vision provider, with retry for rate limits and failover."""
+    # Pages render deterministically, so a retried job or re-scanned page reuses earlier OCR
+    image_digest = None
+    if LLM_MEMO_ENABLED:
+        image_digest = hashlib.sha256(image_bytes).hexdigest()
+        # Text from any configured vision provider will do; each is stored under the model that produced it
+        for provider in OCR_ROUTER.providers:
+            if not provider.supports_vision:
+                continue
+            cached = await asyncio.to_thread(OCR_MEMO.get, _ocr_memo_key(provider, image_digest))
+            if cached is not None:
+                logger.info(f"OCR memo hit ({provider.label})")
+                return cached
+
+    for attempt in range(OCR_MAX_ATTEMPTS):
+        last_attempt = attempt == OCR_MAX_ATTEMPTS - 1
+        provider = OCR_ROUTER.pick(lambda p: p.supports_vision)
+        if provider is None:
+            if not any(p.supports_vision for p in OCR_ROUTER.providers):
+                logger.error("No vision-capable OCR provider is configured")
+                return ""
+            # Every vision provider is recovering and its half-open probe is in flight
+            logger.warning(f"No OCR provider available (attempt {attempt + 1}/{OCR_MAX_ATTEMPTS}), waiting")
+            if not last_attempt:
+                RETRIES.labels(operation="ocr", reason="error").inc()
+                await asyncio.sleep(backoff_delay(attempt, OCR_BACKOFF_BASE, OCR_BACKOFF_MAX))
+            continue
+        if provider.limiter is not None:
+            await provider.limiter.acquire(OCR_TOKENS_PER_PAGE)
+        start = time.monotonic()
+        try:
+            text = await provider.ocr(image_bytes, OCR_INSTRUCTION, mime_type)
+        except RateLimitedError as e:
+            # Rate limits are paced by the limiter rather than counted against the circuit
+            provider.record_outcome("ocr", time.monotonic() - start, e, trip_breaker=False)
+            if not last_attempt:
+                RETRIES.labels(operation="ocr", reason="rate_limited").inc()
+            wait = e.retry_after
+            if wait is None:
+                wait = backoff_delay(attempt, OCR_BACKOFF_BASE, OCR_BACKOFF_MAX)
+            logger.warning(
+                f"{provider.label} returned {e.status_code}, pausing its OCR for {wait:.1f}s "
+                f"(attempt {attempt + 1}/{OCR_MAX_ATTEMPTS})..."
+            )
+            # Every concurrent OCR call on this provider waits, not just this one
+            if provider.limiter is not None:
+                provider.limiter.block_for(wait)
+            elif not last_attempt:
+                await asyncio.sleep(wait)
+            continue
+        except ProviderError as e:
+            provider.record_outcome("ocr", time.monotonic() - start, e)
+            logger.error(f"{provider.label} Vision OCR failed (attempt {attempt + 1}): {e}")
+            if 400 <= e.status_code < 500 and len(OCR_ROUTER.providers) == 1:
+                break
+        except Exception as e:
+            provider.record_outcome("ocr", time.monotonic() - start, e)
+            logger.error(f"{provider.label} Vision OCR error (attempt {attempt + 1}): {e}")
+        else:
+            provider.record_outcome("ocr", time.monotonic() - start, None)
+            if image_digest and text:
+                await asyncio.to_thread(OCR_MEMO.set, _ocr_memo_key(provider, image_digest), text)
+            return text
+        if not last_attempt:
+            RETRIES.labels(operation="ocr", reason="error").inc()
+            await asyncio.sleep(backoff_delay(attempt, OCR_BACKOFF_BASE, OCR_BACKOFF_MAX))
+    return ""
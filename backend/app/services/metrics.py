@@ -0,0 +1,81 @@
+"""Prometheus metrics for the analysis pipeline and its upstream calls."""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Pipeline stages run from milliseconds (cached text parse) to minutes (long scanned reports)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+STAGE_SECONDS = Histogram(
+    "bloodtest_stage_seconds",
+    "Time spent in each analysis stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "bloodtest_llm_request_seconds",
+    "Upstream LLM request latency by provider and outcome",
+    ["provider", "operation", "outcome"],
+    buckets=STAGE_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "bloodtest_llm_tokens_total",
+    "LLM tokens reported in response bodies",
+    ["provider", "model", "kind"],
+)
+CACHE_LOOKUPS = Counter(
+    "bloodtest_cache_lookups_total",
+    "Cache lookups by cache and result (memory_hit, disk_hit, miss)",
+    ["cache", "result"],
+)
+RETRIES = Counter(
+    "bloodtest_retries_total",
+    "Retried operations by reason",
+    ["operation", "reason"],
+)
+FALLBACKS = Counter(
+    "bloodtest_fallbacks_total",
+    "Degraded paths taken: LLM stage fallbacks, unpacked batch extraction, provider failover",
+    ["stage"],
+)
+HEDGED_REQUESTS = Counter(
+    "bloodtest_llm_hedged_requests_total",
+    "Requests for which a second provider was started because the first was slow",
+    ["router"],
+)
+COALESCED_REQUESTS = Counter(
+    "bloodtest_coalesced_requests_total",
+    "Analyses that joined an identical in-flight analysis instead of starting their own",
+)
+OCR_IMAGE_BYTES = Counter(
+    "bloodtest_ocr_image_bytes_total",
+    "OCR page image bytes as plainly rendered and as sent after preprocessing",
+    ["kind"],
+)
+REFERENCE_LOOKUPS = Counter(
+    "bloodtest_reference_lookups_total",
+    "Biomarker name to reference range resolution (cached, exact, fuzzy, miss)",
+    ["result"],
+)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Observe the wall time of the enclosed block in STAGE_SECONDS."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
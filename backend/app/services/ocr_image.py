@@ -0,0 +1,220 @@
+"""
+OCR page image preprocessing: the smallest image that keeps the text legible.
+
+Runs in the PDF worker right after a page is rasterised. The page is
+converted to grayscale, straightened, cleared of solid logos in the
+first page's letterhead, cropped to its printed content and then fitted to a pixel
+and byte budget before it is base64-encoded into the vision request.
+Printed pages compress far better as a few-level grayscale PNG than as
+JPEG, so both are tried and the smaller is sent.
+"""
+
+import io
+import logging
+import math
+import os
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+OCR_GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() == "true"
+OCR_DESKEW = os.getenv("OCR_DESKEW", "true").lower() == "true"
+OCR_STRIP_GRAPHICS = os.getenv("OCR_STRIP_GRAPHICS", "true").lower() == "true"
+# Encode the whole plain colour render for an exact bytes-saved figure (an extra full-size JPEG per
+# page) instead of estimating it from a sample of its rows
+OCR_MEASURE_SAVINGS = os.getenv("OCR_MEASURE_SAVINGS", "false").lower() == "true"
+# Budgets per page image: pixels bound vision tokens, bytes bound upload size
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", "2500000"))
+OCR_MAX_IMAGE_BYTES = int(os.getenv("OCR_MAX_IMAGE_BYTES", "150000"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "70"))
+OCR_MIN_JPEG_QUALITY = int(os.getenv("OCR_MIN_JPEG_QUALITY", "35"))
+# Gray levels of the PNG candidate for grayscale pages (0: JPEG only)
+OCR_PNG_GRAY_LEVELS = int(os.getenv("OCR_PNG_GRAY_LEVELS", "4"))
+
+# Gray level below which a pixel counts as ink
+INK_THRESHOLD = 160
+# Rows/columns with less ink than this share of the page are scanner noise, not content
+NOISE_FRACTION = 0.002
+# Blank border kept around the cropped content, as a share of the shorter side
+CROP_PADDING = 0.02
+# Deskew search range and resolution (degrees); smaller corrections are not worth a resample
+DESKEW_MAX_ANGLE = 5.0
+DESKEW_MIN_ANGLE = 0.3
+DESKEW_SAMPLE_SIZE = 800
+# Top share of the first page searched for letterhead logos
+HEADER_FRACTION = 0.2
+# Ink density above which a header block is a solid graphic; printed text stays well below it
+GRAPHIC_MIN_INK = 0.45
+# Height (share of the page) a block needs before it can count as a graphic rather than a text line
+GRAPHIC_MIN_HEIGHT = 0.02
+# Ink/paper transitions per pixel of width, per row, above which a solid block holds text
+# (a reverse-video banner or shaded table header) and is kept
+GRAPHIC_MAX_TRANSITIONS = 0.02
+MAX_DOWNSCALES = 4
+
+
+def _runs(mask: np.ndarray, min_gap: int = 1) -> list[tuple[int, int]]:
+    """[start, end) runs of True in a 1-D mask, merging runs separated by fewer than `min_gap` False."""
+    runs: list[tuple[int, int]] = []
+    indices = np.flatnonzero(mask)
+    if not len(indices):
+        return runs
+    breaks = np.flatnonzero(np.diff(indices) > min_gap)
+    starts = np.concatenate(([indices[0]], indices[breaks + 1]))
+    ends = np.concatenate((indices[breaks], [indices[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _skew_angle(gray: Image.Image) -> float:
+    """Rotation (degrees, counter-clockwise) that makes text lines horizontal, by projection profile."""
+    sample = gray.copy()
+    sample.thumbnail((DESKEW_SAMPLE_SIZE, DESKEW_SAMPLE_SIZE))
+    # Ink as white on black so rotation fills with "no ink"
+    ink = sample.point(lambda v: 255 if v < INK_THRESHOLD else 0)
+    if not np.asarray(ink).any():
+        return 0.0
+
+    def sharpness(angle: float) -> float:
+        rows = np.asarray(ink.rotate(angle, resample=Image.NEAREST, fillcolor=0), dtype=np.float64).sum(axis=1)
+        return float(np.sum(np.diff(rows) ** 2))
+
+    # Coarse then fine search
+    best = max(np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + 0.01, 0.5), key=sharpness)
+    best = max(np.arange(best - 0.4, best + 0.41, 0.1), key=sharpness)
+    return round(float(best), 1)
+
+
+def _holds_text(block: np.ndarray) -> bool:
+    """Whether a mostly-ink block has paper-coloured glyphs inside it (reverse-video text)."""
+    height, width = block.shape
+    inner = block[height // 4: height - height // 4, 2:-2]
+    if inner.size == 0:
+        return False
+    transitions = np.count_nonzero(inner[:, 1:] != inner[:, :-1], axis=1)
+    return float(transitions.mean()) / width > GRAPHIC_MAX_TRANSITIONS
+
+
+def _header_graphics(pixels: np.ndarray) -> list[tuple[int, int, int, int]]:
+    """Boxes of solid, text-free blocks (logos) in the page header."""
+    height = pixels.shape[0]
+    ink = pixels[: int(height * HEADER_FRACTION)] < INK_THRESHOLD
+    min_height = GRAPHIC_MIN_HEIGHT * height
+    gap = max(int(height * 0.005), 2)
+    boxes = []
+    for top, bottom in _runs(ink.any(axis=1), gap):
+        if bottom - top < min_height:
+            continue
+        band = ink[top:bottom]
+        for left, right in _runs(band.any(axis=0), gap * 2):
+            block = band[:, left:right]
+            if block.mean() >= GRAPHIC_MIN_INK and not _holds_text(block):
+                boxes.append((left, top, right, bottom))
+    return boxes
+
+
+def _content_box(pixels: np.ndarray) -> tuple[int, int, int, int] | None:
+    """Bounding box of the printed content with a small blank border, ignoring speckle."""
+    height, width = pixels.shape
+    ink = pixels < INK_THRESHOLD
+    rows = np.flatnonzero(ink.sum(axis=1) > max(width * NOISE_FRACTION, 2))
+    cols = np.flatnonzero(ink.sum(axis=0) > max(height * NOISE_FRACTION, 2))
+    if not len(rows) or not len(cols):
+        return None
+    pad = int(min(width, height) * CROP_PADDING)
+    return (
+        max(int(cols[0]) - pad, 0),
+        max(int(rows[0]) - pad, 0),
+        min(int(cols[-1]) + 1 + pad, width),
+        min(int(rows[-1]) + 1 + pad, height),
+    )
+
+
+def _fit_pixels(image: Image.Image, max_pixels: int) -> Image.Image:
+    pixels = image.width * image.height
+    if max_pixels <= 0 or pixels <= max_pixels:
+        return image
+    scale = math.sqrt(max_pixels / pixels)
+    size = (max(int(image.width * scale), 1), max(int(image.height * scale), 1))
+    return image.resize(size, Image.LANCZOS)
+
+
+def _jpeg(image: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _png(image: Image.Image, levels: int) -> bytes:
+    """Posterised palette PNG; anti-aliased glyph edges survive with as few as four levels."""
+    step = 256 / levels
+    indexed = Image.frombytes("P", image.size, image.point(lambda v: int(v // step)).tobytes())
+    # A palette of four entries or fewer is written at two bits per pixel
+    indexed.putpalette([c for i in range(levels) for c in (i * 255 // (levels - 1),) * 3])
+    buffer = io.BytesIO()
+    indexed.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def encode_within_budget(image: Image.Image, max_bytes: int = OCR_MAX_IMAGE_BYTES) -> tuple[bytes, str, Image.Image]:
+    """
+    Encode as the smaller of JPEG and (for grayscale) a posterised PNG,
+    stepping the JPEG quality down and then the resolution until the image
+    fits `max_bytes` (0: no byte budget). Returns the data, its MIME type
+    and the image at the resolution it was encoded at.
+    """
+    for downscale in range(MAX_DOWNSCALES + 1):
+        candidates = []
+        if image.mode == "L" and OCR_PNG_GRAY_LEVELS >= 2:
+            candidates.append((_png(image, OCR_PNG_GRAY_LEVELS), "image/png"))
+        if downscale == 0:
+            qualities = list(range(OCR_JPEG_QUALITY, OCR_MIN_JPEG_QUALITY - 1, -10)) or [OCR_JPEG_QUALITY]
+        else:
+            qualities = [min(OCR_MIN_JPEG_QUALITY, OCR_JPEG_QUALITY)]
+        for quality in qualities:
+            candidates.append((_jpeg(image, quality), "image/jpeg"))
+            data, mime_type = min(candidates, key=lambda c: len(c[0]))
+            if max_bytes <= 0 or len(data) <= max_bytes:
+                return data, mime_type, image
+        if downscale < MAX_DOWNSCALES:
+            # Encoded size scales roughly with pixel count
+            image = _fit_pixels(image, int(image.width * image.height * max_bytes / len(data) * 0.9))
+    logger.warning(f"OCR image still {len(data) / 1024:.0f} KB after downscaling, over the {max_bytes / 1024:.0f} KB budget")
+    return data, mime_type, image
+
+
+def preprocess_page_image(image: Image.Image, strip_graphics: bool = False) -> tuple[bytes, str, Image.Image]:
+    """
+    Grayscale, deskew, crop margins and encode within budget. With
+    `strip_graphics` (the first page), letterhead logos are blanked too.
+    """
+    gray = image.convert("L")
+    if OCR_GRAYSCALE:
+        image = gray
+
+    if OCR_DESKEW:
+        angle = _skew_angle(gray)
+        if abs(angle) >= DESKEW_MIN_ANGLE:
+            fill = 255 if image.mode == "L" else (255, 255, 255)
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+            gray = image.convert("L") if image.mode != "L" else image
+
+    pixels = np.array(gray)
+    if strip_graphics and OCR_STRIP_GRAPHICS:
+        boxes = _header_graphics(pixels)
+        if boxes:
+            image = image.copy()
+            for left, top, right, bottom in boxes:
+                pixels[top:bottom, left:right] = 255
+                image.paste(255 if image.mode == "L" else (255, 255, 255), (left, top, right, bottom))
+
+    box = _content_box(pixels)
+    if box is not None:
+        image = image.crop(box)
+
+    image = _fit_pixels(image, OCR_MAX_PIXELS)
+    return encode_within_budget(image)
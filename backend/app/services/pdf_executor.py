@@ -0,0 +1,67 @@
+"""Executor-backed async wrappers that keep PyMuPDF/Pillow work off the event loop."""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from dotenv import load_dotenv
+
+from app.models import PageImage, PDFScan
+from app.services import pdf_parser
+from app.services.pdf_parser import OCR_DEFAULT_DPI, PDFSource
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "process" parses on all cores; "thread" avoids process start-up cost on tiny hosts
+PDF_EXECUTOR = os.getenv("PDF_EXECUTOR", "process").lower()
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: Executor | None = None
+
+
+def get_pdf_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        workers = max(PDF_WORKERS, 1)
+        if PDF_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf")
+        else:
+            # spawn: forked children would inherit the event loop, sockets and SQLite handles
+            _executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        logger.info(f"Started PDF {PDF_EXECUTOR} pool with {workers} workers")
+    return _executor
+
+
+def shutdown_pdf_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_pdf_task(fn, *args, **kwargs):
+    """Run a picklable pdf_parser function in the worker pool."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pdf_executor(), partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (e.g. a malformed PDF crashed MuPDF); replace the pool for later requests
+        logger.error("PDF worker pool crashed, restarting it")
+        shutdown_pdf_executor()
+        raise ValueError("Could not process PDF. The file may be corrupted.")
+
+
+async def scan_pdf_async(pdf: PDFSource) -> PDFScan:
+    return await run_pdf_task(pdf_parser.scan_pdf, pdf)
+
+
+async def render_pages_async(pdf: PDFSource, page_nums: list[int], dpi: int | list[int] = OCR_DEFAULT_DPI) -> list[PageImage]:
+    return await run_pdf_task(pdf_parser.render_pages, pdf, page_nums, dpi)
+
@@ -1,147 +1,298 @@
 import logging
+import os
 import fitz
 import re
-from app.models import ExtractedBiomarker
+from collections.abc import Iterable, Iterator, Sequence
+from dotenv import load_dotenv
+from PIL import Image
+from app.models import ExtractedBiomarker, PageImage, PageLayout, PDFScan, TableExtraction
+from app.services.reference_data import REFERENCE_RANGES, normalize_name, reference_names
+from app.services.chunking import PAGE_BREAK
+from app.services.ocr_image import OCR_MEASURE_SAVINGS, OCR_PREPROCESS, preprocess_page_image
+from app.services.table_parser import extract_table_biomarkers
+from app.services.units import normalize_unit
+
+load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# PDF bytes, or the path of a spooled upload (opened lazily by MuPDF, never read whole into memory)
+PDFSource = bytes | str
 
-def extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    doc.close()
-    return text
-
-
-def is_text_empty(pdf_bytes: bytes) -> bool:
-    """Check if PDF has no extractable text (likely scanned/image-based)."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    text = ""
-    for page in doc:
-        text += page.get_text()
-    doc.close()
-    return not text.strip()
-
-
-def render_page_as_image(pdf_bytes: bytes, page_num: int, dpi: int = 72) -> bytes:
-    """Render a single PDF page as a JPEG image."""
-    import io
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    zoom = dpi / 72
-    matrix = fitz.Matrix(zoom, zoom)
-    page = doc[page_num]
-    pix = page.get_pixmap(matrix=matrix)
-    # Convert to JPEG to reduce size
-    raw = pix.tobytes("png")
-    doc.close()
-    from PIL import Image
-    img = Image.open(io.BytesIO(raw))
-    buf = io.BytesIO()
-    img.save(buf, format="JPEG", quality=70)
-    result = buf.getvalue()
-    logger.info(f"Page {page_num} image size: {len(result) / 1024:.0f} KB")
-    return result
-
-
-def get_page_count(pdf_bytes: bytes) -> int:
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    count = len(doc)
-    doc.close()
-    return count
+# A page with fewer extractable characters than this has no usable text layer
+PAGE_TEXT_MIN_CHARS = int(os.getenv("PAGE_TEXT_MIN_CHARS", "40"))
+# A text page whose text-free images cover this share of it may hold results only as pixels
+MIXED_IMAGE_COVERAGE = float(os.getenv("MIXED_IMAGE_COVERAGE", "0.25"))
+# An image is text-free when the text layer over it is this much sparser than the page average;
+# background and letterhead templates sit under the text and never are
+MIXED_TEXT_DENSITY_RATIO = 0.2
+# Vector paths on a text-less, image-less page above which it is treated as outlined text
+OUTLINED_TEXT_MIN_DRAWINGS = 50
 
-def extract_biomarkers_regex(text: str) -> list[ExtractedBiomarker]:
-    biomarkers = []
-    
-    # Common patterns found in blood test reports
-    patterns = [
-        # Hemoglobin variants
-        (r"(?:Hemoglobin|HGB|Hgb|Hb)\s*[:\-]?\s*(\d+\.?\d*)\s*(g/dL|g/L)", "hemoglobin"),
-        # Hematocrit
-        (r"(?:Hematocrit|HCT|Hct)\s*[:\-]?\s*(\d+\.?\d*)\s*(%)", "hematocrit"),
-        # WBC
-        (r"(?:White Blood Cell|WBC|Leukocytes)\s*[:\-]?\s*(\d+\.?\d*)\s*(x10\^9/L|K/uL|x10E9/L|thou/uL)", "white blood cell"),
-        # RBC
-        (r"(?:Red Blood Cell|RBC|Erythrocytes)\s*[:\-]?\s*(\d+\.?\d*)\s*(x10\^12/L|M/uL|x10E12/L|mil/uL)", "red blood cell"),
-        # Platelets
-        (r"(?:Platelet|PLT|Thrombocytes)\s*[:\-]?\s*(\d+\.?\d*)\s*(x10\^9/L|K/uL|x10E9/L|thou/uL)", "platelet"),
-        # Glucose
-        (r"(?:Glucose|Blood Sugar|Fasting Glucose)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "glucose"),
-        # Cholesterol
-        (r"(?:Total Cholesterol|Cholesterol)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "cholesterol"),
-        # LDL
-        (r"(?:LDL|LDL Cholesterol|LDL-C)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "ldl cholesterol"),
-        # HDL
-        (r"(?:HDL|HDL Cholesterol|HDL-C)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "hdl cholesterol"),
-        # Triglycerides
-        (r"(?:Triglycerides|TG|Trigs)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "triglycerides"),
-        # Creatinine
-        (r"(?:Creatinine|Creat)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|umol/L)", "creatinine"),
-        # BUN
-        (r"(?:BUN|Blood Urea Nitrogen|Urea)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "blood urea nitrogen"),
-        # Sodium
-        (r"(?:Sodium|Na)\s*[:\-]?\s*(\d+\.?\d*)\s*(mEq/L|mmol/L)", "sodium"),
-        # Potassium
-        (r"(?:Potassium|K)\s*[:\-]?\s*(\d+\.?\d*)\s*(mEq/L|mmol/L)", "potassium"),
-        # Iron
-        (r"(?:Iron|Fe|Serum Iron)\s*[:\-]?\s*(\d+\.?\d*)\s*(mcg/dL|ug/dL|umol/L)", "iron"),
-        # Ferritin
-        (r"(?:Ferritin)\s*[:\-]?\s*(\d+\.?\d*)\s*(ng/mL|ug/L|pmol/L)", "ferritin"),
-        # Vitamin D
-        (r"(?:Vitamin D|25-OH|25-Hydroxy)\s*[:\-]?\s*(\d+\.?\d*)\s*(ng/mL|nmol/L)", "vitamin d"),
-        # TSH
-        (r"(?:TSH|Thyroid Stimulating)\s*[:\-]?\s*(\d+\.?\d*)\s*(mIU/L|uIU/mL)", "thyroid stimulating hormone"),
-        # ALT
-        (r"(?:ALT|SGPT|Alanine Aminotransferase)\s*[:\-]?\s*(\d+\.?\d*)\s*(U/L|IU/L)", "alanine aminotransferase"),
-        # AST
-        (r"(?:AST|SGOT|Aspartate Aminotransferase)\s*[:\-]?\s*(\d+\.?\d*)\s*(U/L|IU/L)", "aspartate aminotransferase"),
-        # HbA1c
-        (r"(?:HbA1c|A1C|Hemoglobin A1c|Glycated)\s*[:\-]?\s*(\d+\.?\d*)\s*(%)", "hemoglobin a1c"),
-        # Calcium
-        (r"(?:Calcium|Ca)\s*[:\-]?\s*(\d+\.?\d*)\s*(mg/dL|mmol/L)", "calcium"),
-        # B12
-        (r"(?:Vitamin B12|B12|Cobalamin)\s*[:\-]?\s*(\d+\.?\d*)\s*(pg/mL|pmol/L)", "vitamin b12"),
-    ]
-    
-    for pattern, name in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            value_str, unit = match.groups()
-            try:
-                value = float(value_str)
-                unit = normalize_unit(unit)
-                biomarkers.append(ExtractedBiomarker(name=name, value=value, unit=unit))
-            except ValueError:
+# OCR render resolution: enough pixels per em for the smallest text, never above the scan's own resolution
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "100"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+OCR_DEFAULT_DPI = int(os.getenv("OCR_DEFAULT_DPI", "150"))
+OCR_TARGET_EM_PIXELS = float(os.getenv("OCR_TARGET_EM_PIXELS", "24"))
+# Bytes saved are estimated from every Nth band of rows of the plain render; JPEG codes 8x8 blocks
+# independently, so a quarter of the rows lands within about 10% of the full encode
+SAVINGS_SAMPLE_ROWS = 32
+SAVINGS_SAMPLE_EVERY = 4
+
+
+class PDFDocument:
+    """
+    A PDF opened once for the whole pipeline.
+
+    Exposes the page count, per-page text and lazily rendered page images
+    so callers never re-open the document for each operation.
+    """
+
+    def __init__(self, pdf: PDFSource):
+        try:
+            if isinstance(pdf, bytes):
+                self._doc = fitz.open(stream=pdf, filetype="pdf")
+            else:
+                self._doc = fitz.open(pdf, filetype="pdf")
+        except (fitz.FileDataError, RuntimeError):
+            raise ValueError("Could not process PDF. The file may be corrupted.")
+
+    def __enter__(self) -> "PDFDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._doc.close()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._doc)
+
+    def page_text(self, page_num: int) -> str:
+        return self._doc[page_num].get_text()
+
+    def table(self) -> TableExtraction:
+        return extract_table_biomarkers(self._doc)
+
+    def page_layout(self, page_num: int, text: str | None = None) -> PageLayout:
+        """Classify a page as native text, scanned, mixed or blank, with the DPI to OCR it at."""
+        page = self._doc[page_num]
+        if text is None:
+            text = page.get_text()
+        characters = len("".join(text.split()))
+
+        page_area = abs(page.rect) or 1.0
+        covered = 0.0
+        image_dpi = None
+        boxes = []
+        for info in page.get_image_info():
+            bbox = fitz.Rect(info["bbox"]) & page.rect
+            if bbox.is_empty:
                 continue
-    
-    return biomarkers
-
-
-def normalize_unit(unit: str) -> str:
-    if not unit:
-        return ""
-    
-    unit = unit.lower().strip()
-    
-    unit_map = {
-        "g/l": "g/dL",
-        "mmol/l": "mmol/L",
-        "umol/l": "umol/L",
-        "mg/dl": "mg/dL",
-        "mmeq/l": "mEq/L",
-        "meq/l": "mEq/L",
-        "u/l": "U/L",
-        "iu/l": "U/L",
-        "k/ul": "x10^9/L",
-        "thou/ul": "x10^9/L",
-        "m/ul": "x10^12/L",
-        "mil/ul": "x10^12/L",
-        "uiu/ml": "mIU/L",
-        "miu/l": "mIU/L",
-        "ng/ml": "ng/mL",
-        "ug/dl": "mcg/dL",
-        "mcg/dl": "mcg/dL",
-        "pg/ml": "pg/mL",
-    }
-    return unit_map.get(unit, unit)
\ No newline at end of file
+            boxes.append(bbox)
+            covered += abs(bbox)
+            # Effective resolution of the embedded image at its placed size
+            dpi = info["width"] / (bbox.width / 72) if bbox.width else None
+            if dpi and (image_dpi is None or dpi > image_dpi):
+                image_dpi = dpi
+        coverage = min(covered / page_area, 1.0)
+
+        if characters >= PAGE_TEXT_MIN_CHARS:
+            if (
+                coverage < MIXED_IMAGE_COVERAGE
+                or _text_free_area(page, boxes, characters) < MIXED_IMAGE_COVERAGE * page_area
+            ):
+                return PageLayout(kind="text", characters=characters, image_coverage=round(coverage, 3))
+            kind = "mixed"
+        elif coverage > 0 or len(page.get_drawings()) >= OUTLINED_TEXT_MIN_DRAWINGS:
+            kind = "scanned"
+        else:
+            return PageLayout(kind="blank", characters=characters, image_coverage=coverage)
+
+        font_dpi = None
+        if characters:
+            font_size = _small_font_size(page)
+            if font_size:
+                font_dpi = OCR_TARGET_EM_PIXELS * 72 / font_size
+        # Rendering above the scan's own resolution adds bytes, not detail
+        candidates = [d for d in (font_dpi, image_dpi) if d]
+        dpi = max(candidates) if candidates else OCR_DEFAULT_DPI
+        dpi = int(round(min(max(dpi, OCR_MIN_DPI), OCR_MAX_DPI)))
+        return PageLayout(kind=kind, characters=characters, image_coverage=round(coverage, 3), ocr_dpi=dpi)
+
+    def render_page(self, page_num: int, dpi: int = OCR_DEFAULT_DPI, quality: int = 70) -> PageImage:
+        """Render a page for OCR, preprocessed down to the image budget unless disabled."""
+        zoom = dpi / 72
+        pix = self._doc[page_num].get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        if not OCR_PREPROCESS:
+            rendered = pix.tobytes("jpeg", jpg_quality=quality)
+            return PageImage(data=rendered, width=pix.width, height=pix.height, rendered_bytes=len(rendered))
+        # The plain render is what OCR used to send; encoding all of it only to report savings costs a full JPEG
+        if OCR_MEASURE_SAVINGS:
+            rendered_bytes = len(pix.tobytes("jpeg", jpg_quality=quality))
+        else:
+            rendered_bytes = _estimate_jpeg_bytes(pix, quality)
+        # Letterhead logos are only stripped from the first page; later pages' shaded rows are content
+        data, mime_type, image = preprocess_page_image(
+            Image.frombytes("RGB", (pix.width, pix.height), pix.samples), strip_graphics=page_num == 0
+        )
+        del pix
+        logger.info(f"Page {page_num} image: {len(data) / 1024:.0f} KB ({mime_type}, {image.width}x{image.height})")
+        return PageImage(
+            data=data, mime_type=mime_type, width=image.width, height=image.height, rendered_bytes=rendered_bytes
+        )
+
+    def iter_page_images(
+        self, page_nums: Iterable[int] | None = None, dpi: int | Sequence[int] = OCR_DEFAULT_DPI
+    ) -> Iterator[tuple[int, PageImage]]:
+        """Lazily render pages (at one DPI, or one per page), holding only one pixmap at a time."""
+        if page_nums is None:
+            page_nums = range(self.page_count)
+        page_nums = list(page_nums)
+        dpis = [dpi] * len(page_nums) if isinstance(dpi, int) else list(dpi)
+        for page_num, page_dpi in zip(page_nums, dpis):
+            yield page_num, self.render_page(page_num, page_dpi)
+
+
+def _estimate_jpeg_bytes(pix: fitz.Pixmap, quality: int) -> int:
+    """JPEG size of a pixmap, extrapolated from an encode of a sample of its row bands."""
+    band_starts = range(0, pix.height, SAVINGS_SAMPLE_ROWS * SAVINGS_SAMPLE_EVERY)
+    bands = [(top, min(top + SAVINGS_SAMPLE_ROWS, pix.height)) for top in band_starts]
+    rows = sum(bottom - top for top, bottom in bands)
+    if rows >= pix.height:
+        return len(pix.tobytes("jpeg", jpg_quality=quality))
+    samples = pix.samples_mv
+    data = b"".join(samples[top * pix.stride:bottom * pix.stride] for top, bottom in bands)
+    sample = fitz.Pixmap(pix.colorspace, pix.width, rows, data, False)
+    return round(len(sample.tobytes("jpeg", jpg_quality=quality)) * pix.height / rows)
+
+
+def _text_free_area(page: fitz.Page, boxes: list[fitz.Rect], characters: int) -> float:
+    """Area of the images that have (almost) no text layer over them, i.e. content only as pixels."""
+    page_density = characters / (abs(page.rect) or 1.0)
+    words = [(fitz.Rect(w[:4]), len(w[4])) for w in page.get_text("words")]
+    area = 0.0
+    for box in boxes:
+        inside = sum(chars for rect, chars in words if box.contains((rect.tl + rect.br) / 2))
+        if inside / (abs(box) or 1.0) < MIXED_TEXT_DENSITY_RATIO * page_density:
+            area += abs(box)
+    return area
+
+
+def _small_font_size(page: fitz.Page) -> float | None:
+    """Font size (pt) below which only a tenth of the page's characters are set."""
+    sizes = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                chars = len(span["text"].strip())
+                if chars:
+                    sizes.append((span["size"], chars))
+    if not sizes:
+        return None
+    sizes.sort()
+    threshold = sum(chars for _, chars in sizes) / 10
+    seen = 0
+    for size, chars in sizes:
+        seen += chars
+        if seen >= threshold:
+            return size
+    return sizes[-1][0]
+
+
+def scan_pdf(pdf: PDFSource) -> PDFScan:
+    """Text, page count, per-page layout and table results from a single open of the document."""
+    with PDFDocument(pdf) as doc:
+        page_texts = [doc.page_text(n) for n in range(doc.page_count)]
+        return PDFScan(
+            # Form feed between pages lets the extraction chunker split on page boundaries
+            text=PAGE_BREAK.join(page_texts),
+            page_count=doc.page_count,
+            table=doc.table(),
+            pages=[doc.page_layout(n, text) for n, text in enumerate(page_texts)],
+        )
+
+
+def render_pages(pdf: PDFSource, page_nums: list[int], dpi: int | Sequence[int] = OCR_DEFAULT_DPI) -> list[PageImage]:
+    """Render several pages as OCR-ready images from a single open of the document."""
+    with PDFDocument(pdf) as doc:
+        return [image for _, image in doc.iter_page_images(page_nums, dpi)]
+
+
+# Units recognised after a value, in addition to every reference unit
+_EXTRA_UNITS = [
+    "g/L", "mg/L", "ug/L", "mcg/L", "ng/L", "pg/L", "ng/dL", "ug/dL", "umol/L", "µmol/L", "mmol/L",
+    "nmol/L", "pmol/L", "mmol/mol", "mEq/L", "U/L", "IU/L", "mU/L", "uIU/mL", "µIU/mL", "mIU/mL",
+    "K/uL", "K/µL", "thou/uL", "M/uL", "mil/uL", "x10E9/L", "x10E12/L", "x10^3/uL", "10^9/L",
+    "10^12/L", "x10*9/L", "x10*12/L", "mL/min", "mL/min/1.73m²", "mm/h", "fl", "%",
+    "x10E3/uL", "x10E6/uL", "x10^6/uL", "10^3/uL", "10^6/uL", "10*3/uL", "10*6/uL", "10^3/µL", "10^6/µL",
+    "10³/µL", "10⁶/µL", "10³/μL", "10⁶/μL", "µg/dL", "µg/L", "μg/dL", "μg/L", "μmol/L", "μIU/mL",
+]
+
+
+def _name_regex(name: str) -> str:
+    return r"[\s\-]+".join(re.escape(word) for word in re.split(r"[\s\-]+", name))
+
+
+def _compile_biomarker_scanner() -> tuple[re.Pattern, dict[str, str]]:
+    """
+    Build one pattern covering every reference key and alias.
+
+    Names are alternated longest-first, then followed by a small
+    value/unit grammar, so a single finditer pass finds every occurrence.
+    The unit is mandatory: it rules out stray hits on short aliases such
+    as "K", "Na" or "P". Values behind a comparator ("LDL < 100 mg/dL") are
+    not matched: they are thresholds in interpretation notes, not results.
+    """
+    names = reference_names()
+    units = {ref["unit"] for ref in REFERENCE_RANGES.values()} | set(_EXTRA_UNITS)
+
+    name_alt = "|".join(_name_regex(n) for n in sorted(names, key=len, reverse=True))
+    unit_alt = "|".join(re.escape(u) for u in sorted(units, key=len, reverse=True))
+    pattern = re.compile(
+        rf"(?<![A-Za-z0-9])(?P<name>{name_alt})s?(?![A-Za-z0-9/])"
+        r"(?:[^\S\n]*,?[^\S\n]*(?:count|level|total|serum|plasma)\b)*"  # "White Blood Cell Count"
+        r"(?:[^\S\n]*\([^)\n]{0,30}\))?"                                 # "Hemoglobin (HGB)"
+        r"\s*[:=\-]?\s*"
+        r"(?P<value>\d+(?:[.,]\d+)?)"
+        rf"\s*(?P<unit>{unit_alt})(?![A-Za-z0-9])",
+        re.IGNORECASE,
+    )
+    return pattern, names
+
+
+_BIOMARKER_SCANNER, _SCANNER_NAMES = _compile_biomarker_scanner()
+
+
+def _parse_number(value_str: str) -> float:
+    if "," in value_str:
+        whole, frac = value_str.split(",", 1)
+        # "150,000" is a thousands separator, "5,4" a decimal comma
+        value_str = whole + frac if len(frac) == 3 else f"{whole}.{frac}"
+    return float(value_str)
+
+
+def scan_biomarkers(text: str) -> list[tuple[str, ExtractedBiomarker]]:
+    """All (reference key, biomarker) occurrences in one linear pass over the text."""
+    found = []
+    for match in _BIOMARKER_SCANNER.finditer(text):
+        name = normalize_name(match.group("name"))
+        key = _SCANNER_NAMES.get(name)
+        if key is None:
+            continue
+        try:
+            value = _parse_number(match.group("value"))
+        except ValueError:
+            continue
+        found.append((key, ExtractedBiomarker(name=key, value=value, unit=normalize_unit(match.group("unit")))))
+    return found
+
+
+def extract_biomarkers_regex(text: str) -> list[ExtractedBiomarker]:
+    """Deterministic extraction: the first occurrence of each reference biomarker."""
+    biomarkers = {}
+    for key, biomarker in scan_biomarkers(text):
+        biomarkers.setdefault(key, biomarker)
+    return list(biomarkers.values())
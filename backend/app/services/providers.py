@@ -0,0 +1,579 @@
+"""Pluggable LLM providers with latency tracking, circuit breaking, hedging and failover."""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+
+import httpx
+from dotenv import load_dotenv
+
+from app.services.http_client import (
+    GEMINI_TIMEOUT,
+    GROQ_TIMEOUT,
+    HEALTH_CHECK_TIMEOUT,
+    endpoint_timeout,
+    get_http_client,
+)
+from app.services.metrics import FALLBACKS, HEDGED_REQUESTS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from app.services.rate_limiter import TokenBucketLimiter, retry_after_seconds
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_TEXT_MODEL = os.getenv("GEMINI_TEXT_MODEL", "gemini-2.0-flash")
+GEMINI_OCR_MODEL = os.getenv("GEMINI_OCR_MODEL", "gemini-2.0-flash")
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+
+# Any OpenAI-compatible server (Ollama, vLLM, LM Studio, llama.cpp): e.g. http://localhost:11434/v1
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama3.1")
+LOCAL_LLM_VISION = os.getenv("LOCAL_LLM_VISION", "false").lower() == "true"
+LOCAL_LLM_TIMEOUT = float(os.getenv("LOCAL_LLM_TIMEOUT", str(GROQ_TIMEOUT)))
+
+# Providers in priority order; unconfigured ones (no key / base URL) are skipped
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "groq,gemini,local").split(",") if p.strip()]
+OCR_PROVIDERS = [p.strip() for p in os.getenv("OCR_PROVIDERS", "gemini,local").split(",") if p.strip()]
+
+# Start a second provider when the first has not answered within its p95 latency (clamped)
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() == "true"
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2.0"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "20.0"))
+# Used until a provider has enough samples for a p95
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "10.0"))
+LATENCY_MIN_SAMPLES = 20
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30.0"))
+
+
+class ProviderError(RuntimeError):
+    """A provider answered with an HTTP error status."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RateLimitedError(ProviderError):
+    """The provider answered 429/503; `retry_after` is the server-requested pause, if any."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float | None):
+        super().__init__(message, status_code)
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies and outcomes."""
+
+    def __init__(self, window: int = 200):
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self.last_success: float | None = None
+
+    def record(self, latency: float | None, ok: bool) -> None:
+        if ok:
+            self.last_success = time.time()
+            if latency is not None:
+                self._latencies.append(latency)
+        self._outcomes.append(ok)
+
+    def p95(self, min_samples: int = LATENCY_MIN_SAMPLES) -> float | None:
+        if not self._latencies or len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def success_rate(self) -> float | None:
+        if not self._outcomes:
+            return None
+        return sum(self._outcomes) / len(self._outcomes)
+
+    @property
+    def samples(self) -> int:
+        return len(self._outcomes)
+
+
+class CircuitBreaker:
+    """
+    Opens after consecutive failures and rejects calls for a cool-down;
+    then (half-open) admits a single probe call whose outcome either closes
+    it or reopens it for another cool-down. Other calls fail over while the
+    probe is in flight.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        # When the half-open probe was admitted; a probe lost without an outcome expires after the cool-down
+        self._probe_started: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    @property
+    def probing(self) -> bool:
+        return self._probe_started is not None and time.monotonic() - self._probe_started < self.reset_seconds
+
+    def allow(self) -> bool:
+        """Whether a call could start now (does not claim the half-open probe)."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def begin_call(self) -> bool:
+        """
+        Claim the right to call just before calling: always granted unless
+        half-open with the probe taken, and claims the probe when half-open.
+        """
+        if self.state != "half_open":
+            return True
+        if self.probing:
+            return False
+        self._probe_started = time.monotonic()
+        return True
+
+    def release_probe(self) -> None:
+        """Give the probe back after a call that ended without an outcome (cancelled, rate limited)."""
+        self._probe_started = None
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_started = None
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class Provider:
+    """A text (and optionally vision) completion backend."""
+
+    supports_vision = False
+
+    def __init__(self, name: str, model: str, timeout: float, limiter: TokenBucketLimiter | None = None):
+        self.name = name
+        self.model = model
+        self.timeout = timeout
+        self.limiter = limiter
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+
+    @property
+    def label(self) -> str:
+        return self.name.capitalize()
+
+    def record_outcome(self, operation: str, seconds: float, error: Exception | None, trip_breaker: bool = True) -> None:
+        """Feed one call's result to the latency tracker, the circuit breaker and the metrics."""
+        if error is None:
+            outcome = "success"
+            self.latency.record(seconds, ok=True)
+            self.breaker.record_success()
+        else:
+            outcome = "rate_limited" if isinstance(error, RateLimitedError) else "error"
+            self.latency.record(None, ok=False)
+            if trip_breaker:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+        LLM_REQUEST_SECONDS.labels(provider=self.name, operation=operation, outcome=outcome).observe(seconds)
+
+    async def complete(self, prompt: str, json_output: bool = False) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def ocr(self, image_bytes: bytes, instruction: str, mime_type: str = "image/jpeg") -> str:
+        raise NotImplementedError(f"{self.label} does not support vision")
+
+    def probe_url(self) -> str:
+        raise NotImplementedError
+
+    def usage(self, data: dict) -> tuple[int, int] | None:
+        """(prompt, completion) token counts reported in a response body, if any."""
+        return None
+
+    def record_usage(self, data: dict) -> None:
+        usage = self.usage(data)
+        if usage is not None:
+            LLM_TOKENS.labels(provider=self.name, model=self.model, kind="prompt").inc(usage[0])
+            LLM_TOKENS.labels(provider=self.name, model=self.model, kind="completion").inc(usage[1])
+
+    def probe_headers(self) -> dict | None:
+        return None
+
+    async def probe(self) -> bool:
+        """Cheap reachability and credentials check (a model lookup, no completion)."""
+        client = get_http_client()
+        response = await client.get(
+            self.probe_url(), headers=self.probe_headers(), timeout=endpoint_timeout(HEALTH_CHECK_TIMEOUT)
+        )
+        return response.status_code == 200
+
+    def _raise_for_status(self, response: httpx.Response) -> None:
+        if response.status_code in (429, 503):
+            raise RateLimitedError(
+                f"{self.label} returned {response.status_code}", response.status_code, retry_after_seconds(response)
+            )
+        if response.is_error:
+            raise ProviderError(f"{self.label} API request failed: {response.text}", response.status_code)
+
+    async def _post(self, url: str, payload: dict, headers: dict | None = None) -> dict:
+        client = get_http_client()
+        try:
+            response = await client.post(url, json=payload, headers=headers, timeout=endpoint_timeout(self.timeout))
+        except httpx.ConnectError:
+            raise ConnectionError(f"Cannot connect to {self.label} API. Check your internet connection.")
+        except httpx.TimeoutException:
+            raise RuntimeError(f"{self.label} API request timed out after {self.timeout}s.")
+        self._raise_for_status(response)
+        data = response.json()
+        self.record_usage(data)
+        return data
+
+    async def _stream_lines(self, url: str, payload: dict, headers: dict | None = None) -> AsyncIterator[str]:
+        """`data:` payloads of a server-sent event stream."""
+        client = get_http_client()
+        try:
+            async with client.stream(
+                "POST", url, json=payload, headers=headers, timeout=endpoint_timeout(self.timeout)
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                self._raise_for_status(response)
+                async for line in response.aiter_lines():
+                    if line.startswith("data:"):
+                        yield line[len("data:"):].strip()
+        except httpx.ConnectError:
+            raise ConnectionError(f"Cannot connect to {self.label} API. Check your internet connection.")
+        except httpx.TimeoutException:
+            raise RuntimeError(f"{self.label} API request timed out after {self.timeout}s.")
+
+
+class OpenAICompatibleProvider(Provider):
+    """Chat completions API as served by Groq, OpenAI and local model servers."""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str, timeout: float, vision: bool = False):
+        super().__init__(name, model, timeout)
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/chat/completions"
+        self.api_key = api_key
+        self.supports_vision = vision
+
+    def probe_url(self) -> str:
+        return f"{self.base_url}/models"
+
+    def probe_headers(self) -> dict:
+        return self._headers()
+
+    def usage(self, data: dict) -> tuple[int, int] | None:
+        # Groq reports stream usage in the final chunk under x_groq
+        usage = data.get("usage") or data.get("x_groq", {}).get("usage")
+        if not usage:
+            return None
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    async def complete(self, prompt: str, json_output: bool = False) -> str:
+        payload = {"model": self.model, "messages": [{"role": "user", "content": prompt}]}
+        if json_output:
+            payload["response_format"] = {"type": "json_object"}
+        data = await self._post(self.url, payload, self._headers())
+        return data["choices"][0]["message"]["content"]
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        # JSON mode is not supported together with streaming; the prompts ask for JSON anyway
+        payload = {"model": self.model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+        async for data in self._stream_lines(self.url, payload, self._headers()):
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            self.record_usage(chunk)
+            if not chunk.get("choices"):
+                continue
+            delta = chunk["choices"][0]["delta"].get("content")
+            if delta:
+                yield delta
+
+    async def ocr(self, image_bytes: bytes, instruction: str, mime_type: str = "image/jpeg") -> str:
+        if not self.supports_vision:
+            return await super().ocr(image_bytes, instruction, mime_type)
+        b64 = base64.b64encode(image_bytes).decode("utf-8")
+        payload = {
+            "model": self.model,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": instruction},
+                    {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{b64}"}},
+                ],
+            }],
+        }
+        data = await self._post(self.url, payload, self._headers())
+        return data["choices"][0]["message"]["content"]
+
+
+class GeminiProvider(Provider):
+    """Google Gemini generateContent API (text and vision)."""
+
+    supports_vision = True
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: str, timeout: float,
+                 limiter: TokenBucketLimiter | None = None):
+        super().__init__(name, model, timeout, limiter)
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+
+    def probe_url(self) -> str:
+        return f"{self.base_url}/models/{self.model}?key={self.api_key}"
+
+    def _url(self, method: str, query: str = "") -> str:
+        return f"{self.base_url}/models/{self.model}:{method}?{query}key={self.api_key}"
+
+    def usage(self, data: dict) -> tuple[int, int] | None:
+        usage = data.get("usageMetadata")
+        if not usage:
+            return None
+        return usage.get("promptTokenCount", 0), usage.get("candidatesTokenCount", 0)
+
+    @staticmethod
+    def _text(data: dict) -> str:
+        candidates = data.get("candidates") or [{}]
+        return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+    async def complete(self, prompt: str, json_output: bool = False) -> str:
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        if json_output:
+            payload["generationConfig"] = {"responseMimeType": "application/json"}
+        return self._text(await self._post(self._url("generateContent"), payload))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        last_chunk: dict = {}
+        async for data in self._stream_lines(self._url("streamGenerateContent", "alt=sse&"), payload):
+            last_chunk = json.loads(data)
+            text = self._text(last_chunk)
+            if text:
+                yield text
+        # Every chunk carries the running usage totals; the last one is final
+        self.record_usage(last_chunk)
+
+    async def ocr(self, image_bytes: bytes, instruction: str, mime_type: str = "image/jpeg") -> str:
+        b64 = base64.b64encode(image_bytes).decode("utf-8")
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": instruction},
+                        {"inline_data": {"mime_type": mime_type, "data": b64}},
+                    ]
+                }
+            ]
+        }
+        return self._text(await self._post(self._url("generateContent"), payload))
+
+
+class ProviderRouter:
+    """
+    Sends each call to the healthiest providers in priority order.
+
+    Providers with an open circuit are skipped. A call that fails moves on
+    to the next provider; with hedging enabled, a call that has not
+    finished within the provider's p95 latency also starts the next one,
+    and the first answer wins.
+    """
+
+    def __init__(self, name: str, providers: list[Provider]):
+        self.name = name
+        self.providers = providers
+
+    def fingerprint(self) -> str:
+        """Short hash of the configured provider/model chain, for versioning cached answers."""
+        chain = ",".join(f"{p.name}:{p.model}" for p in self.providers)
+        return hashlib.sha256(chain.encode("utf-8")).hexdigest()[:12]
+
+    def candidates(self) -> list[Provider]:
+        allowed = [p for p in self.providers if p.breaker.allow()]
+        # Every circuit open: trying is better than failing without a request
+        # (callers still skip a provider whose half-open probe is in flight)
+        return allowed or list(self.providers)
+
+    @staticmethod
+    def hedge_delay(provider: Provider) -> float:
+        p95 = provider.latency.p95()
+        return min(max(p95 if p95 is not None else HEDGE_DEFAULT_DELAY, HEDGE_MIN_DELAY), HEDGE_MAX_DELAY)
+
+    async def _timed(self, provider: Provider, call):
+        start = time.monotonic()
+        try:
+            result = await call
+        except asyncio.CancelledError:
+            # A losing hedge says nothing about the provider's health
+            provider.breaker.release_probe()
+            raise
+        except Exception as e:
+            provider.record_outcome("complete", time.monotonic() - start, e)
+            raise
+        provider.record_outcome("complete", time.monotonic() - start, None)
+        return result
+
+    def is_primary(self, provider_name: str | None) -> bool:
+        """Whether `provider_name` is the first-choice provider (not a failover or hedge)."""
+        return bool(self.providers) and self.providers[0].name == provider_name
+
+    async def complete(self, prompt: str, json_output: bool = False) -> str:
+        text, _ = await self.complete_with_provider(prompt, json_output)
+        return text
+
+    async def complete_with_provider(self, prompt: str, json_output: bool = False) -> tuple[str, Provider]:
+        """Completion and the provider that produced it."""
+        candidates = self.candidates()
+        if not candidates:
+            raise RuntimeError(f"No {self.name} provider is configured")
+
+        in_flight: dict[asyncio.Task, Provider] = {}
+        errors: list[Exception] = []
+        launched = 0
+
+        def launch() -> bool:
+            nonlocal launched
+            while launched < len(candidates):
+                provider = candidates[launched]
+                launched += 1
+                if provider.breaker.begin_call():
+                    task = asyncio.create_task(self._timed(provider, provider.complete(prompt, json_output)))
+                    in_flight[task] = provider
+                    return True
+            return False
+
+        if not launch():
+            raise RuntimeError(f"Every {self.name} provider is recovering from failures; try again shortly")
+        try:
+            while in_flight:
+                can_hedge = LLM_HEDGING and launched < len(candidates)
+                delay = self.hedge_delay(candidates[launched - 1]) if can_hedge else None
+                done, _ = await asyncio.wait(in_flight, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    waiting = candidates[launched - 1]
+                    if launch():
+                        logger.info(
+                            f"{waiting.name} has not answered in {delay:.1f}s, "
+                            f"hedging with {candidates[launched - 1].name}"
+                        )
+                        HEDGED_REQUESTS.labels(router=self.name).inc()
+                    continue
+                for task in done:
+                    provider = in_flight.pop(task)
+                    if task.exception() is None:
+                        return task.result(), provider
+                    errors.append(task.exception())
+                    logger.warning(f"{provider.name} call failed: {task.exception()}")
+                if not in_flight and launch():
+                    logger.info(f"Failing over to {candidates[launched - 1].name}")
+                    FALLBACKS.labels(stage="provider_failover").inc()
+            raise errors[-1]
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Stream from the first healthy provider, failing over only until the
+        first delta arrives (after that the partial answer cannot be redone).
+        """
+        errors: list[Exception] = []
+        for provider in self.candidates():
+            if not provider.breaker.begin_call():
+                continue
+            if errors:
+                FALLBACKS.labels(stage="provider_failover").inc()
+            start = time.monotonic()
+            started = False
+            try:
+                async for delta in provider.stream(prompt):
+                    started = True
+                    yield delta
+            except Exception as e:
+                provider.record_outcome("stream", time.monotonic() - start, e)
+                if started:
+                    raise
+                errors.append(e)
+                logger.warning(f"{provider.name} stream failed before any output ({e}), failing over")
+                continue
+            provider.record_outcome("stream", time.monotonic() - start, None)
+            return
+        raise errors[-1] if errors else RuntimeError(
+            f"Every {self.name} provider is recovering from failures; try again shortly"
+        )
+
+    def pick(self, predicate=lambda p: True) -> Provider | None:
+        """Best provider for a caller that handles its own retries (OCR)."""
+        for provider in self.candidates():
+            if predicate(provider) and provider.breaker.begin_call():
+                return provider
+        return None
+
+
+def _build_provider(name: str, purpose: str) -> Provider | None:
+    if name == "groq" and GROQ_API_KEY:
+        return OpenAICompatibleProvider("groq", GROQ_BASE_URL, GROQ_API_KEY, GROQ_MODEL, GROQ_TIMEOUT)
+    if name == "gemini" and GEMINI_API_KEY:
+        if purpose == "ocr":
+            limiter = TokenBucketLimiter("gemini", GEMINI_RPM, GEMINI_TPM)
+            return GeminiProvider("gemini", GEMINI_BASE_URL, GEMINI_API_KEY, GEMINI_OCR_MODEL, GEMINI_TIMEOUT, limiter)
+        return GeminiProvider("gemini", GEMINI_BASE_URL, GEMINI_API_KEY, GEMINI_TEXT_MODEL, GEMINI_TIMEOUT)
+    if name == "local" and LOCAL_LLM_BASE_URL:
+        if purpose == "ocr" and not LOCAL_LLM_VISION:
+            return None
+        return OpenAICompatibleProvider(
+            "local", LOCAL_LLM_BASE_URL, LOCAL_LLM_API_KEY, LOCAL_LLM_MODEL, LOCAL_LLM_TIMEOUT, vision=LOCAL_LLM_VISION
+        )
+    if name not in ("groq", "gemini", "local"):
+        logger.warning(f"Unknown LLM provider '{name}' ignored")
+    return None
+
+
+def build_router(name: str, provider_names: list[str], purpose: str) -> ProviderRouter:
+    providers = [p for p in (_build_provider(n, purpose) for n in provider_names) if p is not None]
+    if not providers:
+        # Nothing configured: keep the historical default so requests fail with the provider's own error
+        if purpose == "ocr":
+            limiter = TokenBucketLimiter("gemini", GEMINI_RPM, GEMINI_TPM)
+            providers = [GeminiProvider("gemini", GEMINI_BASE_URL, GEMINI_API_KEY, GEMINI_OCR_MODEL, GEMINI_TIMEOUT, limiter)]
+        else:
+            providers = [OpenAICompatibleProvider("groq", GROQ_BASE_URL, GROQ_API_KEY, GROQ_MODEL, GROQ_TIMEOUT)]
+    logger.info(f"{name} providers: {', '.join(f'{p.name} ({p.model})' for p in providers)}")
+    return ProviderRouter(name, providers)
+
+
+TEXT_ROUTER = build_router("text", LLM_PROVIDERS, "text")
+OCR_ROUTER = build_router("ocr", OCR_PROVIDERS, "ocr")
@@ -0,0 +1,101 @@
+"""Process-wide token-bucket rate limiting for upstream APIs."""
+
+import asyncio
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucketLimiter:
+    """
+    Limits both requests per minute and (estimated) tokens per minute.
+
+    Callers queue on a lock, so waiters are served in arrival order and a
+    server-requested pause (`block_for`) holds back every caller.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float):
+        self.name = name
+        self.request_capacity = max(requests_per_minute, 1.0)
+        self.token_capacity = max(tokens_per_minute, 1.0)
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.request_capacity, self._requests + elapsed * self.request_capacity / 60.0)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_capacity / 60.0)
+
+    async def acquire(self, tokens: float = 0.0) -> None:
+        tokens = min(tokens, self.token_capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    request_deficit = 1.0 - self._requests
+                    token_deficit = tokens - self._tokens
+                    if request_deficit <= 0 and token_deficit <= 0:
+                        self._requests -= 1.0
+                        self._tokens -= tokens
+                        return
+                    wait = max(
+                        request_deficit * 60.0 / self.request_capacity,
+                        token_deficit * 60.0 / self.token_capacity,
+                    )
+                await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float) -> None:
+        """Pause all callers, e.g. after the upstream returned 429 with Retry-After."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        # The upstream says the window is exhausted; do not burst when it reopens
+        self._requests = min(self._requests, 0.0)
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """Delay requested by the server via Retry-After (seconds or HTTP date) or a Google RetryInfo body."""
+    header = response.headers.get("retry-after")
+    if header:
+        try:
+            return max(float(header), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(header).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    # Some Google endpoints wrap the error object in a one-element list
+    if isinstance(body, list) and body:
+        body = body[0]
+    error = body.get("error") if isinstance(body, dict) else None
+    details = error.get("details") if isinstance(error, dict) else None
+    if not isinstance(details, list):
+        return None
+    for detail in details:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return max(float(delay[:-1]), 0.0)
+            except ValueError:
+                continue
+    return None
+
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Exponential backoff with equal jitter."""
+    delay = min(maximum, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -0,0 +1,24 @@
+"""Biomarker reference data shared by the parser and the analyzer."""
+
+import json
+import re
+from pathlib import Path
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+REFERENCE_RANGES = json.loads((DATA_DIR / "reference_ranges.json").read_text())
+# biomarker ("*" for any) -> from-unit -> reference unit -> factor or {"factor", "offset"}
+UNIT_CONVERSIONS = json.loads((DATA_DIR / "unit_conversions.json").read_text())
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase and collapse whitespace/hyphen runs to single spaces."""
+    return re.sub(r"[\s\-]+", " ", name.lower()).strip()
+
+
+def reference_names() -> dict[str, str]:
+    """Every key and alias (normalized) mapped to its reference key."""
+    names = {}
+    for key, ref in REFERENCE_RANGES.items():
+        for name in [key, *ref.get("aliases", [])]:
+            names.setdefault(normalize_name(name), key)
+    return names
@@ -0,0 +1,91 @@
+"""Single-flight coalescing: concurrent identical computations share one run."""
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    def __init__(self):
+        self.events: list[Any] = []
+        self.error: BaseException | None = None
+        self.done = False
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    Runs at most one event stream per key at a time.
+
+    The first caller for a key starts the stream in a background task;
+    callers arriving while it runs attach to it, replay the events
+    produced so far and then follow it live. Every subscriber sees the
+    same events and the same final error. The run is cancelled only when
+    its last subscriber goes away, so one client disconnecting does not
+    fail the others.
+    """
+
+    def __init__(self, name: str, on_join: Callable[[], None] | None = None):
+        self.name = name
+        self.on_join = on_join
+        self._flights: dict[str, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def _run(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]) -> None:
+        try:
+            async for event in factory():
+                flight.events.append(event)
+                flight.notify()
+        except BaseException as e:
+            flight.error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+        else:
+            logger.info(f"Joining in-flight {self.name} for {key[:16]}")
+            if self.on_join is not None:
+                self.on_join()
+
+        flight.subscribers += 1
+        try:
+            position = 0
+            while True:
+                changed = flight.changed
+                while position < len(flight.events):
+                    yield flight.events[position]
+                    position += 1
+                if flight.done:
+                    if flight.error is not None:
+                        if isinstance(flight.error, asyncio.CancelledError):
+                            raise RuntimeError(f"In-flight {self.name} was cancelled")
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
@@ -0,0 +1,127 @@
+"""Layout-aware extraction of tabular lab results from PyMuPDF word coordinates."""
+
+import re
+from statistics import median
+
+import fitz
+
+from app.models import ExtractedBiomarker, TableExtraction
+from app.services.reference_data import normalize_name, reference_names
+from app.services.units import is_known_unit
+
+_NUMBER = r"\d+(?:[.,]\d+)?"
+_VALUE_RE = re.compile(rf"^(?P<comparator>[<>≤≥]=?)?\s*(?P<value>{_NUMBER})\s*(?:[HL*!]{{1,2}}\b)?\s*(?P<rest>.*)$")
+_RANGE_RE = re.compile(rf"(?P<low>{_NUMBER})\s*[-–]\s*(?P<high>{_NUMBER})|<\s*=?\s*(?P<below>{_NUMBER})")
+_UNIT_RE = re.compile(r"^(?=.*[A-Za-zµ%])[A-Za-zµ%/^*\d.²]{1,20}$")
+_FLAG_RE = re.compile(r"^(?:H|L|HH|LL|High|Low|Normal|\*|!)$", re.IGNORECASE)
+
+_REFERENCE_NAMES = reference_names()
+
+
+def _to_float(text: str) -> float:
+    return float(text.replace(",", "."))
+
+
+def _group_rows(words: list[tuple]) -> list[list[tuple]]:
+    """Cluster words into visual rows by vertical centre."""
+    if not words:
+        return []
+    tolerance = median(w[3] - w[1] for w in words) * 0.5
+    rows: list[list[tuple]] = []
+    centres: list[float] = []
+    for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+        centre = (word[1] + word[3]) / 2
+        if rows and abs(centre - centres[-1]) <= tolerance:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+            centres.append(centre)
+    return [sorted(row, key=lambda w: w[0]) for row in rows]
+
+
+def _split_cells(row: list[tuple]) -> list[str]:
+    """Split a row into cells wherever the horizontal gap is wider than a few spaces."""
+    gap = median(w[3] - w[1] for w in row) * 0.9
+    cells = [[row[0][4]]]
+    for prev, word in zip(row, row[1:]):
+        if word[0] - prev[2] > gap:
+            cells.append([word[4]])
+        else:
+            cells[-1].append(word[4])
+    return [" ".join(cell) for cell in cells]
+
+
+def _parse_range(text: str) -> tuple[float | None, float | None]:
+    match = _RANGE_RE.search(text)
+    if not match:
+        return None, None
+    if match.group("below"):
+        return 0.0, _to_float(match.group("below"))
+    return _to_float(match.group("low")), _to_float(match.group("high"))
+
+
+def parse_row(cells: list[str]) -> tuple[bool, ExtractedBiomarker | None]:
+    """
+    Parse one row as `name | value | unit | range`.
+
+    Returns (is_candidate, biomarker): a candidate row has a text cell
+    followed by a numeric cell. It only yields a biomarker when the unit is
+    a known lab unit and the name is a reference biomarker or the row prints
+    its own range, so "Age: 45 years" or "Page 1 of 2" stay uncovered.
+    Censored results ("<0.5", ">90") are not exact values and stay uncovered
+    too, leaving them to the LLM.
+    """
+    # The first cell is always the name, even when it starts with a digit ("25-OH Vitamin D")
+    for idx, cell in enumerate(cells[1:], start=1):
+        match = _VALUE_RE.match(cell)
+        if match:
+            break
+    else:
+        return False, None
+
+    name = " ".join(cells[:idx])
+    name = re.sub(r"\([^)]*\)", "", name).strip(" :.-*").lower()
+    if sum(c.isalpha() for c in name) < 2 or len(name) > 60:
+        return False, None
+    if match.group("comparator"):
+        return True, None
+
+    tail = [match.group("rest"), *cells[idx + 1:]]
+    tokens = [t for t in " ".join(tail).split() if not _FLAG_RE.match(t)]
+    unit = tokens[0] if tokens and _UNIT_RE.match(tokens[0]) and not _RANGE_RE.match(tokens[0]) else ""
+    if not unit or not is_known_unit(unit):
+        return True, None
+
+    try:
+        value = _to_float(match.group("value"))
+    except ValueError:
+        return True, None
+    low, high = _parse_range(" ".join(tokens[1:]))
+    if low is None and normalize_name(name) not in _REFERENCE_NAMES:
+        return True, None
+    return True, ExtractedBiomarker(name=name, value=value, unit=unit, reference_low=low, reference_high=high)
+
+
+def extract_table_biomarkers(doc: fitz.Document) -> TableExtraction:
+    """
+    Reconstruct result tables on every page.
+
+    Coverage is the share of candidate rows (text then number) that parsed
+    into a recognised result; ages, dates and page footers are candidates
+    that never parse, so they lower it.
+    """
+    biomarkers = []
+    candidate_rows = 0
+    for page in doc:
+        for row in _group_rows(page.get_text("words")):
+            is_candidate, biomarker = parse_row(_split_cells(row))
+            if is_candidate:
+                candidate_rows += 1
+            if biomarker:
+                biomarkers.append(biomarker)
+
+    return TableExtraction(
+        biomarkers=biomarkers,
+        candidate_rows=candidate_rows,
+        coverage=len(biomarkers) / candidate_rows if candidate_rows else 0.0,
+    )
@@ -0,0 +1,83 @@
+"""Lab unit spellings: normalisation to canonical units and the set of units we recognise."""
+
+import re
+
+from app.services.reference_data import REFERENCE_RANGES, UNIT_CONVERSIONS
+
+# Lowercase lab spelling -> canonical unit
+UNIT_ALIASES = {
+    "g/l": "g/L",
+    "mg/l": "mg/L",
+    "ug/l": "ug/L",
+    "mcg/l": "ug/L",
+    "ng/l": "ng/L",
+    "mmol/l": "mmol/L",
+    "umol/l": "umol/L",
+    "µmol/l": "umol/L",
+    "nmol/l": "nmol/L",
+    "pmol/l": "pmol/L",
+    "l/l": "L/L",
+    "mg/dl": "mg/dL",
+    "mmeq/l": "mEq/L",
+    "meq/l": "mEq/L",
+    "u/l": "U/L",
+    "iu/l": "U/L",
+    "k/ul": "x10^9/L",
+    "thou/ul": "x10^9/L",
+    "x10^3/ul": "x10^9/L",
+    "x10^3/mm3": "x10^9/L",
+    "x10^9/l": "x10^9/L",
+    "m/ul": "x10^12/L",
+    "mil/ul": "x10^12/L",
+    "x10^6/ul": "x10^12/L",
+    "x10^6/mm3": "x10^12/L",
+    "x10^12/l": "x10^12/L",
+    "uiu/ml": "mIU/L",
+    "miu/l": "mIU/L",
+    "mu/l": "mIU/L",
+    "miu/ml": "mIU/mL",
+    "fl": "fL",
+    "mm/h": "mm/hr",
+    "ml/min/1.73m2": "mL/min/1.73m2",
+    "ng/ml": "ng/mL",
+    "ng/dl": "ng/dL",
+    "ug/dl": "mcg/dL",
+    "mcg/dl": "mcg/dL",
+    "pg/ml": "pg/mL",
+}
+
+# Canonical spelling of every reference unit, by lowercase form
+_REFERENCE_UNITS = {ref["unit"].lower(): ref["unit"] for ref in REFERENCE_RANGES.values()}
+
+
+def _known_units() -> set[str]:
+    units = set(UNIT_ALIASES.values()) | set(_REFERENCE_UNITS.values())
+    for from_units in UNIT_CONVERSIONS.values():
+        for from_unit, targets in from_units.items():
+            units.add(from_unit)
+            units.update(targets)
+    return units
+
+
+KNOWN_UNITS = _known_units()
+_KNOWN_UNITS_LOWER = {unit.lower(): unit for unit in KNOWN_UNITS}
+
+
+# Micro signs (U+00B5, Greek mu U+03BC) read as "u"; superscript powers as "^n"
+_SPELLING = str.maketrans({"µ": "u", "μ": "u", "²": "2", "³": "^3", "⁶": "^6", "⁹": "^9", " ": None})
+# "10^3/uL", "x10E3/uL", "10*3/uL", "x10^3/uL" -> "x10^3/ul"
+_POWER_RE = re.compile(r"^(?:x\s*)?10\s*(?:\^|\*|e)?\s*(\^?\d+)/")
+
+
+def normalize_unit(unit: str) -> str:
+    if not unit:
+        return ""
+
+    unit = unit.lower().strip().translate(_SPELLING)
+    unit = _POWER_RE.sub(lambda m: f"x10^{m.group(1).lstrip('^')}/", unit)
+    return UNIT_ALIASES.get(unit, _REFERENCE_UNITS.get(unit, _KNOWN_UNITS_LOWER.get(unit, unit)))
+
+
+def is_known_unit(unit: str) -> bool:
+    """Whether `unit` is a lab unit we can normalise (not a word like "years" or "of")."""
+    return normalize_unit(unit) in KNOWN_UNITS
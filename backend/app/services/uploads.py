@@ -0,0 +1,192 @@
+"""Chunked PDF and zip upload ingestion: size limits, magic check, hashing and temp-file spooling."""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Where uploads are spooled for PyMuPDF to open by path; defaults to the system temp dir
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+# Room for multipart boundaries and form fields around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK"
+
+
+class SpooledPDF:
+    """An upload (or zip member) written to a temp file, with its size and content hash."""
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def __enter__(self) -> "SpooledPDF":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def read_bytes(self) -> bytes:
+        return Path(self.path).read_bytes()
+
+    def close(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def content_hash(pdf: bytes | str) -> str:
+    """SHA-256 of PDF bytes, or of the file at a path (read in chunks)."""
+    if isinstance(pdf, bytes):
+        return hashlib.sha256(pdf).hexdigest()
+    digest = hashlib.sha256()
+    with open(pdf, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def pinned_pdf(pdf: bytes | str) -> Iterator[bytes | str]:
+    """
+    A private reference to a spooled upload, for work that may outlive
+    the request that spooled it. Paths are hard-linked (copied where the
+    filesystem refuses) and the link removed on exit; bytes pass through.
+    """
+    if isinstance(pdf, bytes):
+        yield pdf
+        return
+    fd, pinned = tempfile.mkstemp(prefix="pinned-", suffix=".pdf", dir=os.path.dirname(pdf))
+    os.close(fd)
+    os.unlink(pinned)
+    try:
+        os.link(pdf, pinned)
+    except OSError:
+        shutil.copyfile(pdf, pinned)
+    try:
+        yield pinned
+    finally:
+        try:
+            os.unlink(pinned)
+        except FileNotFoundError:
+            pass
+
+
+async def _spool_upload(file: UploadFile, max_bytes: int, suffix: str, magic: bytes, kind: str) -> SpooledPDF:
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, dir=UPLOAD_SPOOL_DIR, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with spool:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                if size == 0 and magic not in chunk[:1024]:
+                    raise ValueError(f"Only {kind} are supported")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB")
+                digest.update(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+        if size == 0:
+            raise ValueError("Uploaded file is empty")
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+
+    return SpooledPDF(spool.name, size, digest.hexdigest())
+
+
+async def spool_pdf_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledPDF:
+    """
+    Copy an upload to a temp file chunk by chunk.
+
+    Rejects non-PDF content from the first chunk and stops reading as soon
+    as `max_bytes` is exceeded, so at most one chunk is held in memory.
+    """
+    if not (file.filename or "").lower().endswith(".pdf"):
+        raise ValueError("Only PDF files are supported")
+    return await _spool_upload(file, max_bytes, ".pdf", PDF_MAGIC, "PDF files")
+
+
+async def spool_zip_upload(file: UploadFile, max_bytes: int) -> SpooledPDF:
+    """Copy a zip upload to a temp file chunk by chunk, like `spool_pdf_upload`."""
+    return await _spool_upload(file, max_bytes, ".zip", ZIP_MAGIC, "zip archives of PDFs")
+
+
+def spool_stream(stream: BinaryIO, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledPDF:
+    """Blocking copy of a file-like object (e.g. a zip member) to a temp file, hashing as it goes."""
+    spool = tempfile.NamedTemporaryFile(prefix="upload-", suffix=".pdf", dir=UPLOAD_SPOOL_DIR, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with spool:
+            while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB")
+                digest.update(chunk)
+                spool.write(chunk)
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+
+    return SpooledPDF(spool.name, size, digest.hexdigest())
+
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies over a per-path limit before they are parsed.
+
+    A declared Content-Length over the limit is refused without reading the
+    body; chunked bodies are counted as they arrive and cut off at the limit.
+    """
+
+    def __init__(self, app, default_limit: int, limits: dict[str, int] | None = None):
+        self.app = app
+        self.default_limit = default_limit
+        self.limits = limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limits.get(scope["path"], self.default_limit)
+        detail = f"Request too large. Maximum size is {limit // (1024 * 1024)}MB"
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            logger.warning(f"Rejected {scope['path']} upload of {int(declared)} bytes")
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
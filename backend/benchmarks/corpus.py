@@ -0,0 +1,123 @@
+"""Synthetic blood test PDFs (text, text without a range column, and scanned) for benchmarking."""
+
+import json
+import random
+from pathlib import Path
+
+import fitz
+
+REFERENCE_RANGES = Path(__file__).parent.parent / "app" / "data" / "reference_ranges.json"
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+ROWS_PER_PAGE = 32
+SCAN_DPI = 150
+
+
+def _biomarker_rows(rng: random.Random, count: int) -> list[tuple[str, str, str, str]]:
+    """(name, value, unit, range) rows drawn from the reference data, some out of range."""
+    ranges = json.loads(REFERENCE_RANGES.read_text())
+    keys = sorted(ranges)
+    rows = []
+    for i in range(count):
+        key = keys[i % len(keys)] if i < len(keys) else rng.choice(keys)
+        entry = ranges[key]
+        low, high = entry["ranges"]["default"]["low"], entry["ranges"]["default"]["high"]
+        span = max(high - low, 1.0)
+        value = round(rng.uniform(max(low - 0.3 * span, 0.0), high + 0.3 * span), 1)
+        name = key.title() if rng.random() < 0.7 or not entry.get("aliases") else entry["aliases"][0].upper()
+        rows.append((name, f"{value:g}", entry.get("unit", ""), f"{low:g} - {high:g}"))
+    return rows
+
+
+def _draw_page(
+    page: fitz.Page, rows: list[tuple[str, str, str, str]], page_num: int, pages: int, rng: random.Random, ranges: bool = True
+) -> None:
+    y = 50
+    page.insert_text((50, y), "CITY GENERAL LABORATORY", fontsize=16)
+    page.insert_text((50, y + 18), "12 Harbour Road, Springfield  Tel 555-0142  Accredited lab no. 4471", fontsize=8)
+    y += 50
+    page.insert_text((50, y), f"Patient: Test Patient {rng.randint(1000, 9999)}    Sex: {rng.choice(['Male', 'Female'])}    Age: {rng.randint(18, 90)}", fontsize=10)
+    page.insert_text((50, y + 14), "Collected: 2024-03-14 08:12    Reported: 2024-03-14 16:40", fontsize=10)
+    y += 40
+    headings = ((50, "Test"), (250, "Result"), (330, "Units"), (430, "Reference Range"))
+    for x, heading in headings if ranges else headings[:3]:
+        page.insert_text((x, y), heading, fontsize=10)
+    y += 18
+    for name, value, unit, reference in rows:
+        page.insert_text((50, y), name, fontsize=10)
+        page.insert_text((250, y), value, fontsize=10)
+        page.insert_text((330, y), unit, fontsize=10)
+        if ranges:
+            page.insert_text((430, y), reference, fontsize=10)
+        y += 19
+    page.insert_text((50, PAGE_HEIGHT - 40), f"Page {page_num + 1} of {pages}    Electronically verified", fontsize=8)
+
+
+def text_pdf(pages: int, seed: int = 0, ranges: bool = True) -> bytes:
+    """A native-text report of `pages` pages, ROWS_PER_PAGE results each, optionally without a range column."""
+    rng = random.Random(seed)
+    rows = _biomarker_rows(rng, pages * ROWS_PER_PAGE)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        _draw_page(page, rows[page_num * ROWS_PER_PAGE:(page_num + 1) * ROWS_PER_PAGE], page_num, pages, rng, ranges)
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def scanned_pdf(pages: int, seed: int = 0, dpi: int = SCAN_DPI) -> bytes:
+    """The same report rasterised page by page, with no text layer (as a scanner produces)."""
+    source = fitz.open(stream=text_pdf(pages, seed), filetype="pdf")
+    doc = fitz.open()
+    for src_page in source:
+        pix = src_page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_image(page.rect, stream=pix.tobytes("jpeg", jpg_quality=80))
+    source.close()
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def norange_pdf(pages: int, seed: int = 0) -> bytes:
+    """A native-text report whose rows are name / value / unit only, with no printed range."""
+    return text_pdf(pages, seed, ranges=False)
+
+
+DOCUMENT_KINDS = {"text": text_pdf, "norange": norange_pdf, "scanned": scanned_pdf}
+
+
+def parse_spec(spec: str) -> list[tuple[str, int]]:
+    """`text:1,scanned:3` -> [("text", 1), ("scanned", 3)]."""
+    documents = []
+    for item in spec.split(","):
+        kind, _, pages = item.strip().partition(":")
+        if kind not in DOCUMENT_KINDS:
+            raise ValueError(f"Unknown document kind '{kind}' (expected {', '.join(DOCUMENT_KINDS)})")
+        documents.append((kind, int(pages or 1)))
+    return documents
+
+
+def build_corpus(spec: str, out_dir: Path | None = None, seed: int = 0) -> dict[str, bytes]:
+    """Named PDFs for a corpus spec, optionally also written to `out_dir`."""
+    corpus = {}
+    for i, (kind, pages) in enumerate(parse_spec(spec)):
+        corpus[f"{kind}-{pages}p"] = DOCUMENT_KINDS[kind](pages, seed + i)
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for name, data in corpus.items():
+            (out_dir / f"{name}.pdf").write_bytes(data)
+    return corpus
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic blood test PDF corpus")
+    parser.add_argument("--corpus", default="text:1,text:5,text:20,norange:5,scanned:1,scanned:3")
+    parser.add_argument("--out", type=Path, default=Path("benchmarks/corpus"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name, data in build_corpus(args.corpus, args.out, args.seed).items():
+        print(f"{args.out / name}.pdf  {len(data) / 1024:.0f} KB")
@@ -0,0 +1,178 @@
+"""
+Local stand-in for the Groq and Gemini APIs, for offline benchmarks.
+
+Serves the OpenAI-compatible chat completions API under /openai/v1 and
+Gemini generateContent under /v1beta with configurable latency and
+periodic 429s. Extraction prompts are answered by reading the report
+text in the prompt, so results scale with the corpus like the real API.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+_NUMBER = re.compile(r"^-?\d+(?:\.\d+)?$")
+_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9 ,()/.%'-]*$")
+_EXPLAIN_LINE = re.compile(r"^- (.+?): ")
+
+OCR_PAGE_TEXT = "\n".join([
+    "CITY GENERAL LABORATORY",
+    "Sex: Female",
+    "Test Result Units Reference Range",
+    "Hemoglobin", "11.2", "g/dL", "12 - 17.5",
+    "Ferritin", "8", "ng/mL", "20 - 500",
+    "Glucose", "101", "mg/dL", "70 - 100",
+    "Vitamin B12", "300", "pg/mL", "200 - 900",
+    "TSH", "2.1", "mIU/L", "0.4 - 4",
+])
+
+
+def extract_from_report(text: str) -> list[dict]:
+    """Name / value / unit triples from report text laid out one cell per line."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    biomarkers = []
+    for i in range(len(lines) - 1):
+        name, value = lines[i], lines[i + 1]
+        if _NAME.match(name) and not _NUMBER.match(name) and _NUMBER.match(value):
+            unit = lines[i + 2] if i + 2 < len(lines) and not re.match(r"^[\d.]+\s*-", lines[i + 2]) else ""
+            biomarkers.append({"name": name.lower(), "value": float(value), "unit": unit})
+    return biomarkers
+
+
+def _section(prompt: str, start: str, end: str) -> str:
+    head, _, rest = prompt.partition(start)
+    return rest.partition(end)[0] if rest else ""
+
+
+def answer(prompt: str) -> str:
+    """The JSON completion our prompts expect, derived from the prompt itself."""
+    if "## Report r" in prompt:
+        reports = re.split(r"^## Report (r\d+)\n", prompt.partition("## Instructions")[0], flags=re.M)[1:]
+        return json.dumps({"reports": [
+            {"id": report_id, "biomarkers": extract_from_report(text)}
+            for report_id, text in zip(reports[::2], reports[1::2])
+        ]})
+    if "## Blood Test Text" in prompt:
+        return json.dumps({"biomarkers": extract_from_report(_section(prompt, "## Blood Test Text", "## Instructions"))})
+    to_explain = [
+        m.group(1) for line in _section(prompt, "## Results To Explain", "## Other Abnormal Results").splitlines()
+        if (m := _EXPLAIN_LINE.match(line))
+    ]
+    return json.dumps({
+        "summary": "Most results are within the normal range; a few values need attention.",
+        "biomarker_explanations": [
+            {"name": name, "explanation": f"{name} is outside its usual range.", "recommendation": "Discuss with your doctor."}
+            for name in to_explain
+        ],
+        "concerns": [f"{name} out of range" for name in to_explain[:3]],
+        "recommendations": ["Stay hydrated", "Repeat the test in three months"],
+    })
+
+
+def _tokens(text: str) -> int:
+    return max(len(text) // 4, 1)
+
+
+class MockLLM:
+    def __init__(self, latency: float, jitter: float, per_kchar: float, rate_limit_every: int, retry_after: float, seed: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_kchar = per_kchar
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    def delay(self, prompt_chars: int) -> float:
+        return max(self.latency + self.rng.uniform(-self.jitter, self.jitter) + self.per_kchar * prompt_chars / 1000, 0.0)
+
+    def rate_limited(self) -> Response | None:
+        self.requests += 1
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached"}}, status_code=429,
+                headers={"retry-after": f"{self.retry_after:g}"},
+            )
+        return None
+
+    async def chat_completions(self, request: Request) -> Response:
+        if limited := self.rate_limited():
+            return limited
+        body = await request.json()
+        content = body["messages"][0]["content"]
+        if isinstance(content, list):
+            prompt, text = "", OCR_PAGE_TEXT
+        else:
+            prompt, text = content, answer(content)
+        await asyncio.sleep(self.delay(len(prompt)))
+        usage = {"prompt_tokens": _tokens(prompt) if prompt else 1290, "completion_tokens": _tokens(text)}
+        if not body.get("stream"):
+            return JSONResponse({"choices": [{"message": {"role": "assistant", "content": text}}], "usage": usage})
+
+        async def events():
+            for i in range(0, len(text), 24):
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': text[i:i + 24]}}]})}\n\n"
+                await asyncio.sleep(0)
+            # Groq reports stream usage in the last chunk
+            yield f"data: {json.dumps({'choices': [], 'x_groq': {'usage': usage}})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def generate_content(self, request: Request) -> Response:
+        if limited := self.rate_limited():
+            return limited
+        body = await request.json()
+        parts = body["contents"][0]["parts"]
+        image = any("inline_data" in part for part in parts)
+        prompt = "".join(part.get("text", "") for part in parts)
+        await asyncio.sleep(self.delay(len(prompt)))
+        text = OCR_PAGE_TEXT if image else answer(prompt)
+        payload = {
+            "candidates": [{"content": {"parts": [{"text": text}]}}],
+            "usageMetadata": {
+                "promptTokenCount": _tokens(prompt) + (258 if image else 0),
+                "candidatesTokenCount": _tokens(text),
+            },
+        }
+        if request.path_params["method"] == "streamGenerateContent":
+            return Response(f"data: {json.dumps(payload)}\n\n", media_type="text/event-stream")
+        return JSONResponse(payload)
+
+    async def models(self, request: Request) -> Response:
+        return JSONResponse({"data": [], "models": []})
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/openai/v1/chat/completions", self.chat_completions, methods=["POST"]),
+            Route("/openai/v1/models", self.models),
+            Route("/v1beta/models/{model}:{method}", self.generate_content, methods=["POST"]),
+            Route("/v1beta/models/{model}", self.models),
+        ])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local Groq/Gemini stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.1, help="+/- seconds of uniform noise")
+    parser.add_argument("--per-kchar", type=float, default=0.02, help="extra seconds per 1000 prompt characters")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with 429 (0: never)")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mock = MockLLM(args.latency, args.jitter, args.per_kchar, args.rate_limit_every, args.retry_after, args.seed)
+    uvicorn.run(mock.app(), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+End-to-end benchmark: synthetic corpus -> pipeline and /analyze, against a local LLM stand-in.
+
+Run from backend/:
+
+    python -m benchmarks.run --clients 1,4,16 --output bench.json
+    python -m benchmarks.run --baseline bench.json   # exit 1 on regression
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import build_corpus
+
+# Metrics where higher is better; everything else numeric is a time or a size
+HIGHER_IS_BETTER = ("throughput_rps",)
+
+# Pipeline event -> the stage it closes (timed from the previous stage event)
+STAGE_EVENTS = {
+    "text_extracted": "text",
+    "biomarkers": "extraction",
+    "analysis": "analysis",
+    "result": "finalize",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _summary(values: list[float]) -> dict:
+    return {
+        "p50": round(statistics.median(values), 4),
+        "p95": round(_percentile(values, 0.95), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class RSSSampler:
+    """Peak resident memory of this process plus its worker processes (Linux /proc)."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_total_mb = 0.0
+        self._task: asyncio.Task | None = None
+
+    def sample(self) -> None:
+        total = _rss_mb(os.getpid()) + sum(_rss_mb(p.pid) for p in multiprocessing.active_children())
+        self.peak_total_mb = max(self.peak_total_mb, total)
+
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.sample()
+        return {
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "peak_rss_with_workers_mb": round(self.peak_total_mb, 1),
+        }
+
+
+def start_mock(args, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "benchmarks.mock_llm", "--port", str(port),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--per-kchar", str(args.per_kchar),
+        "--rate-limit-every", str(args.rate_limit_every), "--retry-after", str(args.retry_after),
+    ]
+    mock = subprocess.Popen(command, cwd=Path(__file__).parent.parent)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return mock
+        except OSError:
+            time.sleep(0.1)
+    mock.kill()
+    raise RuntimeError("Mock LLM server did not start")
+
+
+def configure_env(mock_url: str, work_dir: Path) -> None:
+    """Point the app at the mock and disable caches and request coalescing, unless the caller set these already."""
+    settings = {
+        "GROQ_API_KEY": "bench",
+        "GEMINI_API_KEY": "bench",
+        "GROQ_BASE_URL": f"{mock_url}/openai/v1",
+        "GEMINI_BASE_URL": f"{mock_url}/v1beta",
+        "LOCAL_LLM_BASE_URL": "",
+        "RESULT_CACHE_ENABLED": "false",
+        "LLM_MEMO_ENABLED": "false",
+        "EXPLANATION_LIBRARY_ENABLED": "false",
+        "SINGLE_FLIGHT_ENABLED": "false",
+        "CACHE_DIR": str(work_dir / "cache"),
+        "JOBS_DB": str(work_dir / "jobs.sqlite3"),
+        "JOB_WORKERS": "0",
+        "GEMINI_RPM": "100000",
+    }
+    for name, value in settings.items():
+        os.environ.setdefault(name, value)
+
+
+async def bench_pipeline(corpus: dict[str, bytes], repeat: int) -> dict:
+    """Per-stage timings from the analysis event stream, one document at a time."""
+    from app.services.analyzer import analyze_blood_test, iter_analysis_events
+
+    # Warm up: start the PDF worker pool and HTTP connections outside the timings
+    await analyze_blood_test(next(iter(corpus.values())))
+
+    stages: dict[str, dict[str, list[float]]] = {}
+    for name, pdf in corpus.items():
+        timings = stages.setdefault(name, {})
+        for _ in range(repeat):
+            start = last = time.perf_counter()
+            first_biomarker = True
+            async for event, data in iter_analysis_events(pdf):
+                now = time.perf_counter()
+                if event == "ocr_progress" and data["completed"] == 1:
+                    timings.setdefault("first_ocr_page", []).append(now - start)
+                elif event == "biomarker" and first_biomarker:
+                    timings.setdefault("first_biomarker", []).append(now - start)
+                    first_biomarker = False
+                elif event in STAGE_EVENTS:
+                    timings.setdefault(STAGE_EVENTS[event], []).append(now - last)
+                    last = now
+            timings.setdefault("total", []).append(time.perf_counter() - start)
+    return {name: {stage: _summary(values) for stage, values in timings.items()} for name, timings in stages.items()}
+
+
+async def bench_endpoint(corpus: dict[str, bytes], clients: int, requests: int) -> dict:
+    """Throughput and latency of POST /analyze with `clients` concurrent callers."""
+    import httpx
+    from app.main import app
+
+    documents = list(corpus.items())
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(documents[i % len(documents)])
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        while not queue.empty():
+            name, pdf = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post("/analyze", files={"file": (f"{name}.pdf", pdf, "application/pdf")})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            name, pdf = documents[0]
+            await client.post("/analyze", files={"file": (f"{name}.pdf", pdf, "application/pdf")})
+            start = time.perf_counter()
+            await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+            elapsed = time.perf_counter() - start
+
+    result = {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 3),
+    }
+    if latencies:
+        result["latency"] = _summary(latencies)
+    return result
+
+
+def _flatten(report: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta: float) -> list[str]:
+    """Metrics that got worse than the baseline by more than `tolerance` (and `min_delta` absolute)."""
+    regressions = []
+    current = _flatten(report["results"])
+    for path, before in _flatten(baseline["results"]).items():
+        after = current.get(path)
+        if after is None or path.endswith(("requests", "max")) or ".errors." in path:
+            continue
+        if path.endswith(HIGHER_IS_BETTER):
+            worse = after < before * (1 - tolerance)
+        else:
+            worse = after > before * (1 + tolerance) and after - before > min_delta
+        if worse:
+            regressions.append(f"{path}: {before:g} -> {after:g}")
+    return regressions
+
+
+async def run(args, corpus: dict[str, bytes]) -> dict:
+    sampler = RSSSampler()
+    sampler.start()
+    results: dict = {}
+    if args.mode in ("pipeline", "both"):
+        results["pipeline"] = await bench_pipeline(corpus, args.repeat)
+    if args.mode in ("endpoint", "both"):
+        results["endpoint"] = {}
+        for clients in [int(c) for c in args.clients.split(",")]:
+            requests = max(args.requests, clients)
+            results["endpoint"][f"clients_{clients}"] = await bench_endpoint(corpus, clients, requests)
+    results["memory"] = await sampler.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--corpus", default="text:1,text:5,text:20,norange:5,scanned:1,scanned:3",
+                        help="comma-separated kind:pages documents (kind is text, norange or scanned)")
+    parser.add_argument("--mode", choices=("pipeline", "endpoint", "both"), default="both")
+    parser.add_argument("--repeat", type=int, default=3, help="pipeline runs per document")
+    parser.add_argument("--clients", default="1,4,16", help="concurrency levels for the endpoint benchmark")
+    parser.add_argument("--requests", type=int, default=20, help="requests per concurrency level")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock LLM seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--per-kchar", type=float, default=0.01, help="mock LLM seconds per 1000 prompt characters")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="mock answers every Nth request with 429")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write the report as JSON")
+    parser.add_argument("--baseline", type=Path, help="compare with an earlier report and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="ignore slowdowns smaller than this (s or MB)")
+    args = parser.parse_args()
+
+    port = _free_port()
+    mock = start_mock(args, port)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-") as work_dir:
+            configure_env(f"http://127.0.0.1:{port}", Path(work_dir))
+            corpus = build_corpus(args.corpus, seed=args.seed)
+            results = asyncio.run(run(args, corpus))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    report = {
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance, args.min_delta)
+        if regressions:
+            print("\nRegressions against baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
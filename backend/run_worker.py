@@ -0,0 +1,35 @@
+"""Run job workers without the API, to scale background analysis separately."""
+
+import asyncio
+import logging
+import signal
+
+from app.services.http_client import create_http_client, set_http_client, close_http_client
+from app.services.jobs import JOB_WORKERS, JobWorkerPool
+from app.services.pdf_executor import get_pdf_executor, shutdown_pdf_executor
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+)
+
+
+async def main():
+    set_http_client(create_http_client())
+    get_pdf_executor()
+    pool = JobWorkerPool(max(JOB_WORKERS, 1))
+    pool.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await pool.stop()
+    await close_http_client()
+    shutdown_pdf_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
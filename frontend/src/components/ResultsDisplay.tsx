@@ -7,9 +7,9 @@ interface Biomarker {
   name: string;
   value: number;
   unit: string;
-  reference_low: number;
-  reference_high: number;
-  status: 'low' | 'high' | 'critical' | 'normal';
+  reference_low: number | null;
+  reference_high: number | null;
+  status: 'low' | 'high' | 'critical' | 'normal' | 'unknown';
   explanation: string;
   recommendation: string | null;
 }
@@ -28,9 +28,10 @@ const StatusBadge = ({ status }: { status: string }) => {
     low: { bg: 'bg-amber-50', text: 'text-amber-700', icon: <ArrowDown size={14} /> },
     high: { bg: 'bg-amber-50', text: 'text-amber-700', icon: <ArrowUp size={14} /> },
     critical: { bg: 'bg-red-50', text: 'text-red-700', icon: <AlertCircle size={14} /> },
+    unknown: { bg: 'bg-slate-100', text: 'text-slate-600', icon: <Info size={14} /> },
   };
 
-  const config = configs[status as keyof typeof configs] || configs.normal;
+  const config = configs[status as keyof typeof configs] || configs.unknown;
 
   return (
     <span className={`inline-flex items-center gap-1.5 px-2.5 py-1 rounded-full text-xs font-bold uppercase tracking-wider ${config.bg} ${config.text}`}>
@@ -126,7 +127,11 @@ const ResultsDisplay = ({ result }: { result: AnalysisResult }) => {
                   <span className="text-sm font-medium text-slate-400">{bm.unit}</span>
                 </div>
                 
-                <RangeBar value={bm.value} low={bm.reference_low} high={bm.reference_high} status={bm.status} />
+                {bm.reference_low !== null && bm.reference_high !== null ? (
+                  <RangeBar value={bm.value} low={bm.reference_low} high={bm.reference_high} status={bm.status} />
+                ) : (
+                  <p className="mt-6 text-xs font-medium text-slate-400">No reference range in comparable units</p>
+                )}
                 
                 <p className="mt-8 text-sm text-slate-500 leading-relaxed">
                   {bm.explanation}